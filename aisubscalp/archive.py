@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import uuid
+import zlib
+from dataclasses import fields
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, TextIO
+
+from .models import SourceItem
+
+ARCHIVE_FIELDS = [item_field.name for item_field in fields(SourceItem)]
+RUN_PREFIX = "run-"
+RUN_SUFFIX = ".jsonl.gz"
+RUN_STAMP = "%Y%m%dT%H%M%SZ"
+RUN_OVERLAP = timedelta(days=1)
+
+
+def _run_started(path: Path) -> Optional[datetime]:
+    stamp = path.name[len(RUN_PREFIX) :].split("-", 1)[0]
+    try:
+        return datetime.strptime(stamp, RUN_STAMP).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def new_run_id(started: Optional[datetime] = None) -> str:
+    started = started or datetime.now(timezone.utc)
+    return f"{started.strftime(RUN_STAMP)}-{uuid.uuid4().hex[:8]}"
+
+
+class ArchiveWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._handle: TextIO = gzip.open(path, "wt", encoding="utf-8")
+        self._handle.write(json.dumps({"fields": ARCHIVE_FIELDS}) + "\n")
+
+    def write(self, item: SourceItem) -> None:
+        row = [getattr(item, name) for name in ARCHIVE_FIELDS]
+        self._handle.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        self._handle.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class CandidateArchive:
+    def __init__(self, root: Path, retention_days: Optional[float] = None):
+        self.root = root
+        self.retention_days = retention_days
+
+    @classmethod
+    def from_config(cls, root: Path, settings: dict) -> "CandidateArchive":
+        return cls(root, settings.get("retention_days"))
+
+    def open_run(self, run_id: Optional[str] = None) -> ArchiveWriter:
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.retention_days:
+            self.prune(datetime.now(timezone.utc) - timedelta(days=self.retention_days))
+        # Concurrent scans (one per source in daemon mode) each get their own partition.
+        return ArchiveWriter(self.root / f"{RUN_PREFIX}{run_id or new_run_id()}{RUN_SUFFIX}")
+
+    def runs(self, since: Optional[datetime] = None) -> List[Path]:
+        if not self.root.exists():
+            return []
+        # A run that started shortly before `since` can still hold items found after it;
+        # iter_items() filters those by discovered_at.
+        floor = since - RUN_OVERLAP if since else None
+        paths = []
+        for path in sorted(self.root.glob(f"{RUN_PREFIX}*{RUN_SUFFIX}")):
+            started = _run_started(path)
+            if started is not None and (floor is None or started >= floor):
+                paths.append(path)
+        return paths
+
+    def prune(self, before: datetime) -> int:
+        removed = 0
+        for path in self.runs():
+            started = _run_started(path)
+            if started is not None and started < before:
+                path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logging.info("Pruned %s candidate archive runs", removed)
+        return removed
+
+    def iter_runs(self, since: Optional[datetime] = None) -> Iterator[List[SourceItem]]:
+        floor = since.isoformat() if since else ""
+        for path in self.runs(since):
+            yield [item for item in read_run(path) if item.discovered_at >= floor]
+
+    def iter_items(self, since: Optional[datetime] = None) -> Iterator[SourceItem]:
+        for run in self.iter_runs(since):
+            yield from run
+
+
+def read_run(path: Path) -> Iterator[SourceItem]:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            header = json.loads(next(handle, "{}") or "{}")
+            names = header.get("fields", ARCHIVE_FIELDS)
+            for line in handle:
+                values = dict(zip(names, json.loads(line), strict=False))
+                yield SourceItem(
+                    **{name: values[name] for name in ARCHIVE_FIELDS if name in values}
+                )
+    except (EOFError, zlib.error, gzip.BadGzipFile, json.JSONDecodeError) as exc:
+        # A run that is still being written, or was killed mid-write, ends early.
+        logging.debug("Stopped reading %s early: %s", path, exc)
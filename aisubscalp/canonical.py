@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import replace
+from html import unescape
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .models import SourceItem
+
+TRACKING_PARAMS = {
+    "ref",
+    "ref_src",
+    "referrer",
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_hsenc",
+    "_hsmi",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+# host -> (path prefix, query parameter holding the target URL)
+REDIRECTORS: Dict[str, Tuple[str, str]] = {
+    "duckduckgo.com": ("/l/", "uddg"),
+    "out.reddit.com": ("/", "url"),
+    "www.google.com": ("/url", "q"),
+    "google.com": ("/url", "q"),
+    "l.facebook.com": ("/l.php", "u"),
+    "lm.facebook.com": ("/l.php", "u"),
+    "www.youtube.com": ("/redirect", "q"),
+    "l.instagram.com": ("/", "u"),
+    "slack-redir.net": ("/link", "url"),
+}
+
+
+def _absolute(url: str) -> str:
+    url = unescape(url.strip())
+    if url.startswith("//"):
+        return "https:" + url
+    return url
+
+
+def unwrap_redirect(url: str, max_hops: int = 3) -> str:
+    url = _absolute(url)
+    for _ in range(max_hops):
+        parts = urlsplit(url)
+        redirector = REDIRECTORS.get((parts.hostname or "").lower())
+        if not redirector or not parts.path.startswith(redirector[0]):
+            break
+        target = dict(parse_qsl(parts.query)).get(redirector[1])
+        if not target:
+            break
+        url = _absolute(target)
+    return url
+
+
+def _is_tracking(param: str) -> bool:
+    lowered = param.lower()
+    return lowered in TRACKING_PARAMS or lowered.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url: str) -> str:
+    url = unwrap_redirect(url)
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in {("http", 80), ("https", 443)}:
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking(key)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def _append_unique(values: List[str], value: str) -> None:
+    if value and value not in values:
+        values.append(value)
+
+
+def merge_candidates(items: Iterable[SourceItem]) -> List[SourceItem]:
+    groups: "OrderedDict[str, Tuple[SourceItem, List[str], List[str], List[str]]]" = OrderedDict()
+    for item in items:
+        key = canonicalize_url(item.url)
+        if key not in groups:
+            groups[key] = (item, [], [], [])
+        first, texts, sources, urls = groups[key]
+        if item is not first:
+            _append_unique(texts, item.title)
+        _append_unique(texts, item.snippet)
+        _append_unique(sources, item.source)
+        for url in item.source_urls or [item.url]:
+            _append_unique(urls, url)
+
+    merged: List[SourceItem] = []
+    for key, (first, texts, sources, urls) in groups.items():
+        merged.append(
+            replace(
+                first,
+                url=key,
+                snippet=" ".join(text for text in texts if text != first.title),
+                source=", ".join(sources),
+                source_urls=urls,
+            )
+        )
+    return merged
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .httpclient import HttpClient, PooledAdapter
+from .models import utc_now_iso
+from .ratelimit import HostRateLimiter
+
+SCHEMA = """
+create table if not exists runs (
+    run_id text primary key,
+    started_at text not null
+);
+create table if not exists blobs (
+    digest text primary key,
+    body blob not null,
+    size integer not null
+);
+create table if not exists exchanges (
+    run_id text not null,
+    seq integer not null,
+    method text not null,
+    url text not null,
+    status integer not null,
+    reason text,
+    headers text not null,
+    digest text not null,
+    recorded_at text not null,
+    primary key (run_id, seq)
+);
+create index if not exists exchanges_digest on exchanges (digest);
+"""
+
+# The stored body is already decoded, so these would describe it wrongly on replay.
+DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+
+@dataclass
+class Exchange:
+    method: str
+    url: str
+    status: int
+    reason: Optional[str]
+    headers: Dict[str, str]
+    digest: str
+    recorded_at: str
+
+
+class CassetteStore:
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._seq: Dict[str, int] = {}
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("pragma journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, path: Path, settings: Dict[str, Any]) -> "CassetteStore":
+        return cls(path, max_bytes=int(settings.get("max_mb", 512) * 1024 * 1024))
+
+    def start_run(self, run_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert or ignore into runs (run_id, started_at) values (?, ?)",
+                (run_id, utc_now_iso()),
+            )
+            self._conn.commit()
+            self._seq[run_id] = 0
+
+    def record(
+        self,
+        run_id: str,
+        method: str,
+        url: str,
+        status: int,
+        reason: Optional[str],
+        headers: Dict[str, str],
+        body: bytes,
+    ) -> None:
+        digest = hashlib.sha256(body).hexdigest()
+        kept = {key: value for key, value in headers.items() if key.lower() not in DROPPED_HEADERS}
+        with self._lock:
+            # Content-addressed: a body seen before (same page, another run) is stored once.
+            if not self._conn.execute("select 1 from blobs where digest = ?", (digest,)).fetchone():
+                blob = zlib.compress(body)
+                self._conn.execute(
+                    "insert into blobs (digest, body, size) values (?, ?, ?)",
+                    (digest, blob, len(blob)),
+                )
+            seq = self._seq.get(run_id, 0)
+            self._seq[run_id] = seq + 1
+            self._conn.execute(
+                """
+                insert into exchanges (
+                    run_id, seq, method, url, status, reason, headers, digest, recorded_at
+                ) values (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    run_id,
+                    seq,
+                    method,
+                    url,
+                    status,
+                    reason,
+                    json.dumps(kept, ensure_ascii=True),
+                    digest,
+                    utc_now_iso(),
+                ),
+            )
+            self._conn.commit()
+
+    def body(self, digest: str) -> bytes:
+        with self._lock:
+            row = self._conn.execute(
+                "select body from blobs where digest = ?", (digest,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        return zlib.decompress(row[0])
+
+    def exchanges(self, run_id: str) -> List[Exchange]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                select method, url, status, reason, headers, digest, recorded_at
+                from exchanges where run_id = ? order by seq
+                """,
+                (run_id,),
+            ).fetchall()
+        return [
+            Exchange(method, url, status, reason, json.loads(headers), digest, recorded_at)
+            for method, url, status, reason, headers, digest, recorded_at in rows
+        ]
+
+    def runs(self) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            return self._conn.execute("""
+                select runs.run_id, runs.started_at, count(exchanges.seq)
+                from runs left join exchanges on exchanges.run_id = runs.run_id
+                group by runs.run_id order by runs.started_at, runs.run_id
+                """).fetchall()
+
+    def resolve(self, run_id: str) -> Optional[str]:
+        runs = [run for run, _, _ in self.runs()]
+        if run_id == "latest":
+            return runs[-1] if runs else None
+        return run_id if run_id in runs else None
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("select coalesce(sum(size), 0) from blobs").fetchone()[0]
+
+    def enforce_retention(self, keep: Optional[str] = None) -> int:
+        removed = 0
+        with self._lock:
+            total = self._conn.execute("select coalesce(sum(size), 0) from blobs").fetchone()[0]
+            while total > self.max_bytes:
+                row = self._conn.execute(
+                    "select run_id from runs where run_id != ? order by started_at, run_id",
+                    (keep or "",),
+                ).fetchone()
+                if row is None:
+                    break
+                self._conn.execute("delete from exchanges where run_id = ?", row)
+                self._conn.execute("delete from runs where run_id = ?", row)
+                # Blobs are shared between runs; only drop the ones nothing points at now.
+                self._conn.execute(
+                    "delete from blobs where digest not in (select digest from exchanges)"
+                )
+                total = self._conn.execute("select coalesce(sum(size), 0) from blobs").fetchone()[0]
+                removed += 1
+            self._conn.commit()
+        if removed:
+            logging.info("Dropped %s recorded runs to stay under the cassette size limit", removed)
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CassetteMiss(requests.ConnectionError):
+    pass
+
+
+class UnpacedLimiter(HostRateLimiter):
+    # Replayed responses never leave the machine, recorded 429s included.
+    def wait(self, url: str, deadline: Optional[float] = None) -> bool:
+        return True
+
+    def observe(self, url: str, response: requests.Response) -> None:
+        pass
+
+
+class CassetteAdapter(PooledAdapter):
+    def __init__(
+        self, store: CassetteStore, run_id: str, replay: bool = False, *args: Any, **kwargs: Any
+    ):
+        self.store = store
+        self.run_id = run_id
+        self.replay = replay
+        self.misses = 0
+        self._queues: Dict[Tuple[str, str], Deque[Exchange]] = {}
+        self._queue_lock = threading.Lock()
+        if replay:
+            for exchange in store.exchanges(run_id):
+                key = (exchange.method, exchange.url)
+                self._queues.setdefault(key, deque()).append(exchange)
+        super().__init__(*args, **kwargs)
+
+    def send(self, request: requests.PreparedRequest, *args: Any, **kwargs: Any) -> Any:
+        if self.replay:
+            return self._replay(request)
+        method, url = request.method or "GET", request.url or ""
+        response = super().send(request, *args, **kwargs)
+        self.store.record(
+            self.run_id,
+            method,
+            url,
+            response.status_code,
+            response.reason,
+            dict(response.headers),
+            response.content,
+        )
+        return response
+
+    def _replay(self, request: requests.PreparedRequest) -> requests.Response:
+        key = (request.method or "GET", request.url or "")
+        with self._queue_lock:
+            queue = self._queues.get(key)
+            if not queue:
+                self.misses += 1
+                raise CassetteMiss(f"Not recorded in run {self.run_id}: {key[1]}", request=request)
+            # Repeated requests get the recordings in order; the last one is served again.
+            exchange = queue.popleft() if len(queue) > 1 else queue[0]
+        response = requests.Response()
+        response.status_code = exchange.status
+        response.reason = exchange.reason or ""
+        response.headers = CaseInsensitiveDict(exchange.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = exchange.url
+        response.request = request
+        response._content = self.store.body(exchange.digest)
+        response._content_consumed = True
+        return response
+
+
+def attach_cassette(
+    client: HttpClient, store: CassetteStore, run_id: str, replay: bool = False
+) -> CassetteAdapter:
+    adapter = CassetteAdapter(
+        store,
+        run_id,
+        replay,
+        pool_connections=client.adapter._pool_connections,
+        pool_maxsize=client.adapter._pool_maxsize,
+        max_retries=0,
+    )
+    client.adapter = adapter
+    client.session.mount("https://", adapter)
+    client.session.mount("http://", adapter)
+    if replay:
+        client.limiter = UnpacedLimiter()
+    return adapter
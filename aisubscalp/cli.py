@@ -3,15 +3,33 @@ from __future__ import annotations
 import argparse
 import logging
 import os
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-
-from .config import load_config
-from .discovery import discover_all
-from .exporter import export_csv, export_json
-from .scan import build_deals, to_dicts
-from .scheduler import run_schedule
-from .storage import fetch_deals, init_db, upsert_deals
-from .utils import RateLimiter, setup_logging
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .archive import CandidateArchive, new_run_id
+from .cassette import CassetteStore, attach_cassette
+from .config import AppConfig, load_config
+from .daemon import Daemon, ScanRuntime
+from .discovery import SourceCursors, iter_discover, plan_discovery
+from .exporter import DELTA_FIELDS, EXPORT_FORMATS, export_records
+from .models import Deal, SourceItem, utc_now_iso
+from .planner import format_plan
+from .rescore import rescore
+from .scan import stream_deals, to_dicts
+from .storage import (
+    get_watermark,
+    init_db,
+    iter_deal_changes,
+    iter_deals,
+    set_watermark,
+    store_deals,
+)
+from .utils import setup_logging
+from .verify import VerificationCache
 
 
 def _default_repo_root() -> Path:
@@ -33,54 +51,278 @@ def _default_log_path() -> Path:
     return _default_repo_root() / "logs" / "aisubscalp.log"
 
 
+def _default_http_cache_path(args: argparse.Namespace) -> Path:
+    return Path(args.db_path).parent / "http_cache.db"
+
+
+def _default_archive_path(args: argparse.Namespace) -> Path:
+    return Path(args.db_path).parent / "candidates"
+
+
+def _default_cassette_path(args: argparse.Namespace) -> Path:
+    return Path(args.db_path).parent / "cassettes.db"
+
+
+def _default_replay_path(args: argparse.Namespace, run_id: str) -> Path:
+    return Path(args.db_path).parent / "replays" / f"{run_id}.db"
+
+
+# Rows stamped in the last few seconds may belong to a scan batch that is still being committed.
+WATERMARK_LAG = timedelta(seconds=5)
+
+
+def _expire_after(config_export: Dict) -> timedelta:
+    return timedelta(days=config_export.get("expire_after_days", 14))
+
+
+def _shift(timestamp: str, delta: timedelta) -> str:
+    return (datetime.fromisoformat(timestamp) - delta).isoformat()
+
+
+def _batching(config: AppConfig) -> Optional[dict]:
+    return config.planner if config.planner.get("enabled", True) else None
+
+
+def _archive(args: argparse.Namespace, config: AppConfig) -> Optional[CandidateArchive]:
+    # A replay re-finds recorded candidates; archiving them again would duplicate the run.
+    if not config.archive.get("enabled", True) or getattr(args, "replay", None):
+        return None
+    return CandidateArchive.from_config(_default_archive_path(args), config.archive)
+
+
+def _select_sources(config: AppConfig, only: Optional[Set[str]]) -> Tuple[List[str], dict]:
+    if only is None:
+        return config.queries, config.sources
+    queries = config.queries if "duckduckgo" in only else []
+    return queries, {name: value for name, value in config.sources.items() if name in only}
+
+
 def scan_command(args: argparse.Namespace) -> None:
     config = load_config(Path(args.config_dir))
-    limiter = RateLimiter(config.rate_limit_seconds[0], config.rate_limit_seconds[1])
+    if getattr(args, "plan", False):
+        tasks = plan_discovery(
+            config.queries, config.sources, os.getenv("GITHUB_TOKEN"), None, _batching(config)
+        )
+        print(format_plan(tasks))
+        return
+    if args.record or args.replay:
+        # A recording must hold every response a replay will ask for, so both modes fetch
+        # everything fresh: no cursors, no HTTP cache, no cached verifications.
+        args.full_rescan = args.no_http_cache = args.refresh_verifications = True
+        cassette_scan(args)
+        return
+    with _runtime(args) as runtime:
+        run_scan(args, runtime)
+
+
+def _runtime(args: argparse.Namespace) -> ScanRuntime:
+    cache_path = None if getattr(args, "no_http_cache", False) else _default_http_cache_path(args)
+    return ScanRuntime(Path(args.config_dir), Path(args.db_path), cache_path)
+
+
+def _fresh_db(path: Path) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+
+def cassette_scan(args: argparse.Namespace) -> None:
+    config = load_config(Path(args.config_dir))
+    store = CassetteStore.from_config(_default_cassette_path(args), config.cassettes)
+    try:
+        if args.replay:
+            run_id = store.resolve(args.replay)
+            if run_id is None:
+                logging.error("No recorded run %s in %s", args.replay, _default_cassette_path(args))
+                return
+            # Replayed pages are old: their deals, verifications and cursors go to a scratch
+            # database, never the live one.
+            args.db_path = str(_default_replay_path(args, run_id))
+            _fresh_db(Path(args.db_path))
+        else:
+            run_id = new_run_id()
+            store.start_run(run_id)
+        with _runtime(args) as runtime:
+            _, client = runtime.snapshot()
+            adapter = attach_cassette(client, store, run_id, replay=bool(args.replay))
+            if args.replay:
+                logging.info("Replaying recorded run %s into %s", run_id, args.db_path)
+                run_scan(args, runtime)
+                logging.info("Replay of %s: %s requests were not recorded", run_id, adapter.misses)
+            else:
+                logging.info("Recording HTTP exchanges as run %s", run_id)
+                run_scan(args, runtime, run_id=run_id)
+                store.enforce_retention(keep=run_id)
+                logging.info("Recorded run %s (replay with: scan --replay %s)", run_id, run_id)
+    finally:
+        store.close()
+
+
+def run_scan(
+    args: argparse.Namespace,
+    runtime: ScanRuntime,
+    only: Optional[Set[str]] = None,
+    deadline: Optional[float] = None,
+    run_id: Optional[str] = None,
+) -> Dict[str, int]:
+    config, client = runtime.snapshot()
+    conn = runtime.conn
     github_token = os.getenv("GITHUB_TOKEN")
+    queries, sources = _select_sources(config, only)
+    verifier = VerificationCache.from_config(
+        conn, config.verification, refresh=getattr(args, "refresh_verifications", False)
+    )
+    cursors = None if getattr(args, "full_rescan", False) else SourceCursors(conn)
+    export_target = getattr(args, "export", None)
+    archive = _archive(args, config)
+    writer = archive.open_run(run_id) if archive else None
+
+    exported: Dict[tuple, Deal] = {}
+    counts: Counter = Counter()
+
+    def discovered(items: Iterable[SourceItem]) -> Iterator[SourceItem]:
+        for item in items:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            counts["items"] += 1
+            if writer:
+                writer.write(item)
+            yield item
+        # Discovery itself also stops early, without an item, once the deadline passes.
+        if deadline is not None and time.monotonic() >= deadline:
+            counts["cut_short"] += 1
+            logging.warning("Scan deadline reached; stopping discovery early")
+
+    def accepted(deals: Iterable[Deal]) -> Iterator[Deal]:
+        for deal in deals:
+            counts["deals"] += 1
+            if export_target:
+                exported[(deal.app_name, deal.promo_type, deal.website_url)] = deal
+            yield deal
 
     logging.info("Starting discovery...")
-    items = discover_all(
-        queries=config.queries,
-        sources=config.sources,
-        limiter=limiter,
+    items = iter_discover(
+        queries=queries,
+        sources=sources,
+        client=client,
         limit=config.max_results_per_source,
         github_token=github_token,
+        workers=getattr(args, "workers", None) or config.discovery_workers,
+        cursors=cursors,
+        batching=_batching(config),
+        deadline=deadline,
+    )
+    deals = stream_deals(discovered(items), config, client, verifier, deadline)
+    try:
+        stored = store_deals(
+            conn,
+            accepted(deals),
+            batch_size=config.pipeline.get("store_batch_size", 25),
+            revive_before=_shift(utc_now_iso(), _expire_after(config.export)),
+        )
+    finally:
+        if writer:
+            writer.close()
+            logging.info("Archived %s candidates to %s", writer.count, writer.path)
+    # Results fetched but dropped at the deadline must be fetched again next time.
+    if cursors and not counts["cut_short"]:
+        logging.info("Advanced %s source cursors", cursors.commit())
+    logging.info("Discovered %s candidate items", counts["items"])
+    logging.info("Accepted %s deals after filtering", counts["deals"])
+    logging.info(
+        "Verification cache: %s hits, %s misses (%.0f%% hit ratio)",
+        verifier.hits,
+        verifier.misses,
+        verifier.hit_ratio * 100,
+    )
+    client.log_stats()
+
+    logging.info(
+        "Stored %s deals in SQLite (%s inserted, %s updated, %s unchanged)",
+        stored.total,
+        stored.inserted,
+        stored.updated,
+        stored.unchanged,
     )
-    logging.info("Discovered %s candidate items", len(items))
-
-    deals = build_deals(items, config, limiter)
-    logging.info("Accepted %s deals after filtering", len(deals))
 
-    conn = init_db(Path(args.db_path))
-    upserted = upsert_deals(conn, deals)
-    logging.info("Stored %s deals in SQLite", upserted)
-
-    if args.export:
-        records = to_dicts(deals)
-        export_path = Path(args.export)
-        if args.format == "json":
-            export_json(records, export_path)
-        else:
-            export_csv(records, export_path)
-        logging.info("Exported %s records to %s", len(records), export_path)
+    if export_target:
+        export_path = Path(export_target)
+        count = export_records(
+            to_dicts(exported.values()), export_path, args.format, getattr(args, "gzip", False)
+        )
+        logging.info("Exported %s records to %s", count, export_path)
+    return {
+        "items": counts["items"],
+        "deals": counts["deals"],
+        "inserted": stored.inserted,
+        "updated": stored.updated,
+        "unchanged": stored.unchanged,
+    }
+
+
+def _delta_records(
+    args: argparse.Namespace, conn: sqlite3.Connection, target: str
+) -> Tuple[Iterator[dict], str]:
+    expire = _expire_after(load_config(Path(args.config_dir)).export)
+    until = (datetime.now(timezone.utc) - WATERMARK_LAG).isoformat()
+    since = args.since or get_watermark(conn, target) or ""
+    records = iter_deal_changes(
+        conn,
+        since=since,
+        until=until,
+        expire_before=_shift(until, expire),
+        expired_since=_shift(since, expire) if since else "",
+    )
+    return records, until
 
 
 def export_command(args: argparse.Namespace) -> None:
     conn = init_db(Path(args.db_path))
-    records = fetch_deals(conn)
     export_path = Path(args.output)
-    if args.format == "json":
-        export_json(records, export_path)
+    delta = args.since_last or args.since is not None
+    if delta and (args.category or args.promo_type or args.status):
+        logging.error("Delta exports cannot be combined with --category/--promo-type/--status.")
+        return
+
+    if not delta:
+        records = iter_deals(
+            conn,
+            category=args.category,
+            promo_type=args.promo_type,
+            verification_status=args.status,
+            since=args.found_after,
+            until=args.found_before,
+        )
+        count = export_records(records, export_path, args.format, args.gzip)
+        logging.info("Exported %s records to %s", count, export_path)
+        return
+
+    target = args.target or str(export_path.resolve())
+    records, watermark = _delta_records(args, conn, target)
+    count = export_records(records, export_path, args.format, args.gzip, DELTA_FIELDS)
+    if args.since_last:
+        set_watermark(conn, target, watermark, utc_now_iso())
+    logging.info("Exported %s changes to %s (watermark %s)", count, export_path, watermark)
+
+
+def rescore_command(args: argparse.Namespace) -> None:
+    config = load_config(Path(args.config_dir))
+    conn = init_db(Path(args.db_path))
+    archive = CandidateArchive.from_config(_default_archive_path(args), config.archive)
+    if args.since:
+        since = datetime.fromisoformat(args.since)
+        since = since if since.tzinfo else since.replace(tzinfo=timezone.utc)
     else:
-        export_csv(records, export_path)
-    logging.info("Exported %s records to %s", len(records), export_path)
+        since = datetime.now(timezone.utc) - _expire_after(config.export)
+    rescore(conn, config, archive, since, args.workers)
 
 
 def run_command(args: argparse.Namespace) -> None:
-    def task() -> None:
-        scan_command(args)
+    def scan(runtime: ScanRuntime, only: Set[str], deadline: Optional[float]) -> None:
+        run_scan(args, runtime, only, deadline)
 
-    run_schedule(task, args.interval)
+    daemon = Daemon(_runtime(args), scan, args.interval)
+    daemon.install_signal_handlers()
+    daemon.run_forever()
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -94,17 +336,78 @@ def build_parser() -> argparse.ArgumentParser:
 
     scan = subparsers.add_parser("scan", help="Discover and scan sources")
     scan.add_argument("--export", help="Optional export path")
-    scan.add_argument("--format", choices=["json", "csv"], default="json")
+    scan.add_argument("--format", choices=EXPORT_FORMATS, default="json")
+    scan.add_argument("--gzip", action="store_true", help="Gzip-compress the export")
+    scan.add_argument(
+        "--workers", type=int, help="Discovery hosts fetched in parallel (1 = sequential)"
+    )
+    scan.add_argument("--no-http-cache", action="store_true", help="Always refetch discovery pages")
+    scan.add_argument(
+        "--plan", action="store_true", help="Print the discovery requests and exit without fetching"
+    )
+    scan.add_argument(
+        "--full-rescan",
+        action="store_true",
+        help="Ignore reddit/HN cursors and fetch the newest results again",
+    )
+    recording = scan.add_mutually_exclusive_group()
+    recording.add_argument(
+        "--record",
+        action="store_true",
+        help="Store every HTTP response of this scan for later replay",
+    )
+    recording.add_argument(
+        "--replay",
+        metavar="RUN_ID",
+        help='Serve every request from a recorded run ("latest" for the newest); no network',
+    )
+    scan.add_argument(
+        "--refresh-verifications",
+        action="store_true",
+        help="Ignore cached verification results and re-check every URL",
+    )
     scan.set_defaults(func=scan_command)
 
     export = subparsers.add_parser("export", help="Export from SQLite")
     export.add_argument("--output", required=True, help="Output file path")
-    export.add_argument("--format", choices=["json", "csv"], default="json")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="json")
+    export.add_argument("--gzip", action="store_true", help="Gzip-compress the export")
+    export.add_argument("--category", help="Only deals in this category")
+    export.add_argument("--promo-type", help='Only deals of this promo type, e.g. "Free Trial"')
+    export.add_argument("--status", help="Only deals with this verification status")
+    export.add_argument("--found-after", help="Only deals found at or after this ISO timestamp")
+    export.add_argument("--found-before", help="Only deals found before this ISO timestamp")
+    export.add_argument(
+        "--since-last",
+        action="store_true",
+        help="Only deals added, changed or expired since the last --since-last export",
+    )
+    export.add_argument(
+        "--since", help="Only deals added, changed or expired after this ISO timestamp"
+    )
+    export.add_argument(
+        "--target", help="Watermark name for --since-last (defaults to the output path)"
+    )
     export.set_defaults(func=export_command)
 
+    rescore_parser = subparsers.add_parser(
+        "rescore", help="Re-apply the current filters to archived candidates (no network)"
+    )
+    rescore_parser.add_argument(
+        "--since",
+        help="Only candidates found at or after this ISO timestamp "
+        "(default: export.expire_after_days ago)",
+    )
+    rescore_parser.add_argument(
+        "--workers", type=int, help="Processes to classify with (default: one per CPU)"
+    )
+    rescore_parser.set_defaults(func=rescore_command)
+
     run = subparsers.add_parser("run", help="Run scheduled scans")
     run.add_argument("--scheduled", action="store_true")
-    run.add_argument("--interval", type=int, default=360)
+    run.add_argument(
+        "--interval", type=int, help="Default minutes between runs for sources without their own"
+    )
     run.set_defaults(func=run_command)
 
     return parser
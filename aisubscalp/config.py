@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Dict, List
 
@@ -13,6 +13,17 @@ class AppConfig:
     sources: Dict[str, Any]
     rate_limit_seconds: List[float]
     max_results_per_source: int
+    discovery_workers: int = 1
+    rate_limits: Dict[str, Any] = field(default_factory=dict)
+    http: Dict[str, Any] = field(default_factory=dict)
+    http_cache: Dict[str, Any] = field(default_factory=dict)
+    verification: Dict[str, Any] = field(default_factory=dict)
+    pipeline: Dict[str, Any] = field(default_factory=dict)
+    export: Dict[str, Any] = field(default_factory=dict)
+    planner: Dict[str, Any] = field(default_factory=dict)
+    schedule: Dict[str, Any] = field(default_factory=dict)
+    archive: Dict[str, Any] = field(default_factory=dict)
+    cassettes: Dict[str, Any] = field(default_factory=dict)
 
 
 def _load_json(path: Path) -> Dict[str, Any]:
@@ -29,4 +40,15 @@ def load_config(config_dir: Path) -> AppConfig:
         sources=sources["sources"],
         rate_limit_seconds=sources.get("rate_limit_seconds", [1.0, 2.5]),
         max_results_per_source=sources.get("max_results_per_source", 60),
+        discovery_workers=sources.get("discovery_workers", 1),
+        rate_limits=sources.get("rate_limits", {}),
+        http=sources.get("http", {}),
+        http_cache=sources.get("http_cache", {}),
+        verification=sources.get("verification", {}),
+        pipeline=sources.get("pipeline", {}),
+        export=sources.get("export", {}),
+        planner=sources.get("planner", {}),
+        schedule=sources.get("schedule", {}),
+        archive=sources.get("archive", {}),
+        cassettes=sources.get("cassettes", {}),
     )
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import logging
+import signal
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .config import AppConfig, load_config
+from .httpcache import HttpCache
+from .httpclient import HttpClient
+from .ratelimit import HostRateLimiter
+from .scheduler import SourceJob, SourceScheduler, jobs_from_config
+from .storage import init_db
+
+CONFIG_FILES = ("keywords.json", "sources.json")
+CONFIG_POLL_SECONDS = 30.0
+
+
+def source_names(config: AppConfig) -> List[str]:
+    return (["duckduckgo"] if config.queries else []) + list(config.sources)
+
+
+def _network_settings(config: AppConfig) -> Tuple[Any, ...]:
+    return (config.rate_limits, config.rate_limit_seconds, config.http, config.http_cache)
+
+
+class ScanRuntime:
+    def __init__(self, config_dir: Path, db_path: Path, http_cache_path: Optional[Path] = None):
+        self.config_dir = config_dir
+        self.db_path = db_path
+        self.http_cache_path = http_cache_path
+        self.config: AppConfig
+        self.limiter: HostRateLimiter
+        self.client: HttpClient
+        self._mtimes: Dict[str, float] = {}
+        self._retired: List[HttpClient] = []
+        self._connections: List[sqlite3.Connection] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reload(force=True)
+
+    def _config_mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for name in CONFIG_FILES:
+            path = self.config_dir / name
+            mtimes[name] = path.stat().st_mtime if path.exists() else 0.0
+        return mtimes
+
+    def _build_client(self, config: AppConfig) -> HttpClient:
+        limiter = HostRateLimiter.from_config(config.rate_limits, config.rate_limit_seconds)
+        cache = None
+        if self.http_cache_path and config.http_cache.get("enabled", True):
+            cache = HttpCache.from_config(self.http_cache_path, config.http_cache)
+        self.limiter = limiter
+        return HttpClient.from_config(config.http, limiter, cache)
+
+    def reload(self, force: bool = False) -> bool:
+        mtimes = self._config_mtimes()
+        with self._lock:
+            if not force and mtimes == self._mtimes:
+                return False
+            config = load_config(self.config_dir)
+            if not hasattr(self, "client"):
+                self.client = self._build_client(config)
+            elif _network_settings(config) != _network_settings(self.config):
+                # Runs in flight keep the client they started with; it is closed on shutdown.
+                self._retired.append(self.client)
+                self.client = self._build_client(config)
+            self.config = config
+            self._mtimes = mtimes
+        return True
+
+    def snapshot(self) -> Tuple[AppConfig, HttpClient]:
+        with self._lock:
+            return self.config, self.client
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = init_db(self.db_path)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            for client in [*self._retired, self.client]:
+                client.close()
+            for conn in self._connections:
+                conn.close()
+            self._retired.clear()
+            self._connections.clear()
+
+    def __enter__(self) -> "ScanRuntime":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class Daemon:
+    def __init__(
+        self,
+        runtime: ScanRuntime,
+        scan: Callable[[ScanRuntime, Set[str], Optional[float]], None],
+        interval_minutes: Optional[float] = None,
+    ):
+        self.runtime = runtime
+        self.scan = scan
+        self.interval_minutes = interval_minutes
+        self.scheduler = SourceScheduler(
+            self._jobs(), self._run_job, runtime.config.schedule.get("max_concurrent", 4)
+        )
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._reload = threading.Event()
+
+    def _jobs(self) -> List[SourceJob]:
+        config = self.runtime.config
+        return jobs_from_config(config.schedule, source_names(config), self.interval_minutes)
+
+    def _run_job(self, job: SourceJob, deadline: Optional[float]) -> None:
+        self.scan(self.runtime, {job.name}, deadline)
+
+    def request_reload(self, *_: Any) -> None:
+        self._reload.set()
+        self._wake.set()
+
+    def request_stop(self, *_: Any) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def install_signal_handlers(self) -> None:
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.request_reload)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+    def _maybe_reload(self) -> None:
+        forced = self._reload.is_set()
+        self._reload.clear()
+        try:
+            changed = self.runtime.reload(force=forced)
+        except (OSError, ValueError, KeyError) as exc:
+            logging.error("Config reload failed; keeping the previous config: %s", exc)
+            return
+        if changed:
+            logging.info("Config reloaded from %s", self.runtime.config_dir)
+            self.scheduler.replace_jobs(self._jobs())
+
+    def run_forever(self) -> None:
+        logging.info(
+            "Daemon started: %s",
+            ", ".join(f"{job.name} every {job.interval / 60:g}m" for job in self.scheduler.jobs),
+        )
+        self.scheduler.start()
+        try:
+            while not self._stop.is_set():
+                self._maybe_reload()
+                wait = self.scheduler.run_pending()
+                self._wake.wait(min(wait, CONFIG_POLL_SECONDS))
+                self._wake.clear()
+            logging.info("Draining %s in-flight runs", self.scheduler.in_flight())
+        finally:
+            self.scheduler.shutdown()
+            self.runtime.close()
+        logging.info("Daemon stopped")
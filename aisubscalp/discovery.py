@@ -1,16 +1,27 @@
 from __future__ import annotations
 
 import logging
+import queue
 import re
-from html import unescape
-from typing import Iterable, List, Optional
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import quote_plus, urlparse
+from xml.etree import ElementTree
 
 import requests
 from bs4 import BeautifulSoup
 
-from .models import SourceItem
-from .utils import RateLimiter, pick_user_agent
+from .canonical import unwrap_redirect
+from .httpclient import HttpClient
+from .models import SourceItem, utc_now_iso
+from .planner import REDDIT_MAX_LIMIT, or_query, plan_hackernews, plan_reddit
+from .storage import get_cursor, save_cursors
 
 SOCIAL_DOMAINS = {
     "facebook.com",
@@ -24,22 +35,44 @@ SOCIAL_DOMAINS = {
 }
 
 
-def _get(url: str, limiter: RateLimiter, timeout: int = 20) -> Optional[str]:
-    limiter.wait()
-    headers = {"User-Agent": pick_user_agent()}
+def _restore_items(cached: List[dict]) -> List[SourceItem]:
+    return [SourceItem(**fields) for fields in cached]
+
+
+def _fetch_items(
+    url: str,
+    client: HttpClient,
+    source: str,
+    parse: Callable[[str], List[SourceItem]],
+) -> List[SourceItem]:
+    cache = client.cache
+    entry = cache.lookup(url) if cache else None
+    if entry and entry.items is not None and cache.is_fresh(entry, source):
+        return _restore_items(entry.items)
     try:
-        response = requests.get(url, headers=headers, timeout=timeout)
-        if response.status_code != 200:
-            logging.debug("Non-200 response %s for %s", response.status_code, url)
-            return None
-        return response.text
+        response = client.get(url, headers=cache.validators(entry) if cache else None)
     except requests.RequestException as exc:
         logging.debug("Request failed for %s: %s", url, exc)
-        return None
+        return []
+    if response.status_code == 304 and entry:
+        cache.refresh(url, response)
+        if entry.items is not None:
+            return _restore_items(entry.items)
+        return parse(entry.body)
+    if response.status_code != 200:
+        logging.debug("Non-200 response %s for %s", response.status_code, url)
+        return []
+    items = parse(response.text)
+    if cache:
+        cached = [asdict(item) for item in items]
+        for fields in cached:
+            fields.pop("discovered_at", None)
+        cache.store(url, response, cached)
+    return items
 
 
 def _clean_url(url: str) -> str:
-    url = unescape(url)
+    url = unwrap_redirect(url)
     parsed = urlparse(url)
     if not parsed.scheme or not parsed.netloc:
         return ""
@@ -48,11 +81,7 @@ def _clean_url(url: str) -> str:
     return url.split("#")[0]
 
 
-def search_duckduckgo(query: str, limiter: RateLimiter, limit: int) -> List[SourceItem]:
-    url = f"https://duckduckgo.com/html/?q={quote_plus(query)}"
-    html = _get(url, limiter)
-    if not html:
-        return []
+def _parse_duckduckgo(html: str, limit: int) -> List[SourceItem]:
     soup = BeautifulSoup(html, "html.parser")
     items: List[SourceItem] = []
     for result in soup.select("a.result__a"):
@@ -67,81 +96,189 @@ def search_duckduckgo(query: str, limiter: RateLimiter, limit: int) -> List[Sour
     return items
 
 
-def search_reddit(subreddit: str, query: str, limiter: RateLimiter, limit: int) -> List[SourceItem]:
-    url = (
+def search_duckduckgo(query: str, client: HttpClient, limit: int) -> List[SourceItem]:
+    url = f"https://duckduckgo.com/html/?q={quote_plus(query)}"
+    return _fetch_items(url, client, "duckduckgo", partial(_parse_duckduckgo, limit=limit))
+
+
+# Pages fetched per query when catching up to a stored cursor.
+CURSOR_MAX_PAGES = 5
+
+
+class SourceCursors:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, source: str, query: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            pending = self._pending.get((source, query))
+            return pending or get_cursor(self.conn, source, query)
+
+    def advance(self, source: str, query: str, cursor: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pending[(source, query)] = cursor
+
+    def commit(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if pending:
+                save_cursors(self.conn, pending, utc_now_iso())
+        return len(pending)
+
+
+def _get_json(client: HttpClient, url: str, headers: Optional[dict] = None) -> Optional[dict]:
+    try:
+        resp = client.get(url, headers=headers)
+        if resp.status_code != 200:
+            return None
+        return resp.json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def search_reddit(
+    subreddit: str,
+    query: str,
+    client: HttpClient,
+    limit: int,
+    cursors: Optional[SourceCursors] = None,
+    fan_in: int = 1,
+) -> List[SourceItem]:
+    # fan_in > 1 when the planner coalesced several (subreddit, query) origins into this request;
+    # it pages on until it has as many posts as the separate requests would have returned.
+    wanted = limit * max(fan_in, 1)
+    page_size = min(wanted, REDDIT_MAX_LIMIT)
+    pages = -(-wanted // page_size)
+    source = f"reddit/{subreddit}"
+    cursor = cursors.get(source, query) if cursors else None
+    base_url = (
         f"https://www.reddit.com/r/{subreddit}/search.json?"
-        f"q={quote_plus(query)}&restrict_sr=1&sort=new&limit={limit}"
+        f"q={quote_plus(query)}&restrict_sr=1&sort=new&limit={page_size}"
     )
-    limiter.wait()
     headers = {"User-Agent": "aisubscalp/0.1"}
-    try:
-        resp = requests.get(url, headers=headers, timeout=20)
-        if resp.status_code != 200:
-            return []
-        payload = resp.json()
-    except requests.RequestException:
-        return []
-    except ValueError:
-        return []
 
+    batched = "+" in subreddit
     items: List[SourceItem] = []
-    for child in payload.get("data", {}).get("children", []):
-        data = child.get("data", {})
-        title = data.get("title", "")
-        permalink = data.get("url", "")
-        if not title or not permalink:
-            continue
-        items.append(
-            SourceItem(
-                title=title,
-                url=permalink,
-                source=f"reddit/{subreddit}",
-                snippet=data.get("selftext", "")[:280],
+    newest: Optional[Dict[str, Any]] = None
+    after = None
+    fetched = 0
+    for _ in range(max(pages, CURSOR_MAX_PAGES) if cursor else pages):
+        payload = _get_json(client, base_url + (f"&after={after}" if after else ""), headers)
+        if payload is None:
+            return items
+        reached = False
+        children = payload.get("data", {}).get("children", [])
+        fetched += len(children)
+        for child in children:
+            data = child.get("data", {})
+            created = float(data.get("created_utc") or 0)
+            if cursor and (
+                data.get("name") == cursor["fullname"] or created < cursor["created_utc"]
+            ):
+                reached = True
+                break
+            if newest is None or created > newest["created_utc"]:
+                newest = {"fullname": data.get("name"), "created_utc": created}
+            title = data.get("title", "")
+            permalink = data.get("url", "")
+            if not title or not permalink:
+                continue
+            items.append(
+                SourceItem(
+                    title=title,
+                    url=permalink,
+                    source=f"reddit/{data.get('subreddit') or subreddit}" if batched else source,
+                    snippet=data.get("selftext", "")[:280],
+                )
             )
-        )
+        after = payload.get("data", {}).get("after")
+        if reached or not after or (not cursor and fetched >= wanted):
+            break
+
+    if cursors and newest:
+        cursors.advance(source, query, newest)
     return items
 
 
-def search_hackernews(query: str, limiter: RateLimiter, limit: int) -> List[SourceItem]:
-    url = (
-        "https://hn.algolia.com/api/v1/search_by_date?"
-        f"query={quote_plus(query)}&tags=story&hitsPerPage={limit}"
+def _search_algolia(
+    cursor_key: str,
+    params: str,
+    client: HttpClient,
+    limit: int,
+    cursors: Optional[SourceCursors],
+    keep: Callable[[dict], bool],
+) -> List[SourceItem]:
+    cursor = cursors.get("hackernews", cursor_key) if cursors else None
+    base_url = (
+        "https://hn.algolia.com/api/v1/search_by_date?" f"{params}&tags=story&hitsPerPage={limit}"
     )
-    limiter.wait()
-    try:
-        resp = requests.get(url, timeout=20)
-        if resp.status_code != 200:
-            return []
-        payload = resp.json()
-    except (requests.RequestException, ValueError):
-        return []
+    if cursor:
+        base_url += "&numericFilters=" + quote_plus(f"created_at_i>{cursor['created_at_i']}")
 
     items: List[SourceItem] = []
-    for hit in payload.get("hits", []):
-        title = hit.get("title") or ""
-        url = hit.get("url") or ""
-        if not title or not url:
-            continue
-        items.append(
-            SourceItem(
-                title=title,
-                url=url,
-                source="hackernews",
-                snippet=hit.get("story_text") or "",
+    newest = cursor["created_at_i"] if cursor else 0
+    for page in range(CURSOR_MAX_PAGES if cursor else 1):
+        payload = _get_json(client, base_url + (f"&page={page}" if page else ""))
+        if payload is None:
+            return items
+        for hit in payload.get("hits", []):
+            newest = max(newest, int(hit.get("created_at_i") or 0))
+            title = hit.get("title") or ""
+            url = hit.get("url") or ""
+            if not title or not url or not keep(hit):
+                continue
+            items.append(
+                SourceItem(
+                    title=title,
+                    url=url,
+                    source="hackernews",
+                    snippet=hit.get("story_text") or "",
+                )
             )
-        )
+        if page + 1 >= payload.get("nbPages", 0):
+            break
+
+    if cursors and newest:
+        cursors.advance("hackernews", cursor_key, {"created_at_i": newest})
     return items
 
 
-def search_producthunt_rss(feed_url: str, limiter: RateLimiter, limit: int) -> List[SourceItem]:
-    xml = _get(feed_url, limiter)
-    if not xml:
+def search_hackernews(
+    query: str,
+    client: HttpClient,
+    limit: int,
+    cursors: Optional[SourceCursors] = None,
+) -> List[SourceItem]:
+    params = f"query={quote_plus(query)}"
+    return _search_algolia(query, params, client, limit, cursors, lambda hit: True)
+
+
+def search_hackernews_merged(
+    queries: List[str],
+    client: HttpClient,
+    limit: int,
+    cursors: Optional[SourceCursors] = None,
+) -> List[SourceItem]:
+    if len(queries) == 1:
+        return search_hackernews(queries[0], client, limit, cursors)
+    # plan_hackernews() only groups queries with the same words: they match the same stories,
+    # so one search stands in for all of them.
+    params = f"query={quote_plus(queries[0])}"
+    return _search_algolia(or_query(queries), params, client, limit, cursors, lambda hit: True)
+
+
+def _parse_producthunt_rss(xml: str, limit: int) -> List[SourceItem]:
+    # ElementTree rather than BeautifulSoup's "xml" builder, which needs lxml.
+    try:
+        root = ElementTree.fromstring(xml.encode("utf-8"))
+    except ElementTree.ParseError:
         return []
-    soup = BeautifulSoup(xml, "xml")
     items: List[SourceItem] = []
-    for item in soup.find_all("item"):
-        title = item.title.text if item.title else ""
-        link = item.link.text if item.link else ""
+    for item in root.iter("item"):
+        title = (item.findtext("title") or "").strip()
+        link = (item.findtext("link") or "").strip()
         if not title or not link:
             continue
         items.append(SourceItem(title=title, url=link, source="producthunt", snippet=""))
@@ -150,10 +287,13 @@ def search_producthunt_rss(feed_url: str, limiter: RateLimiter, limit: int) -> L
     return items
 
 
-def scrape_directory(url: str, limiter: RateLimiter, limit: int) -> List[SourceItem]:
-    html = _get(url, limiter)
-    if not html:
-        return []
+def search_producthunt_rss(feed_url: str, client: HttpClient, limit: int) -> List[SourceItem]:
+    return _fetch_items(
+        feed_url, client, "producthunt", partial(_parse_producthunt_rss, limit=limit)
+    )
+
+
+def _parse_directory(html: str, limit: int) -> List[SourceItem]:
     soup = BeautifulSoup(html, "html.parser")
     items: List[SourceItem] = []
     for link in soup.find_all("a", href=True):
@@ -167,14 +307,19 @@ def scrape_directory(url: str, limiter: RateLimiter, limit: int) -> List[SourceI
     return items
 
 
-def search_github(query: str, limiter: RateLimiter, limit: int, token: Optional[str]) -> List[SourceItem]:
+def scrape_directory(url: str, client: HttpClient, limit: int) -> List[SourceItem]:
+    return _fetch_items(url, client, "directory", partial(_parse_directory, limit=limit))
+
+
+def search_github(
+    query: str, client: HttpClient, limit: int, token: Optional[str]
+) -> List[SourceItem]:
     if not token:
         return []
     url = f"https://api.github.com/search/repositories?q={quote_plus(query)}&per_page={limit}"
-    limiter.wait()
     headers = {"Authorization": f"Bearer {token}", "User-Agent": "aisubscalp/0.1"}
     try:
-        resp = requests.get(url, headers=headers, timeout=20)
+        resp = client.get(url, headers=headers)
         if resp.status_code != 200:
             return []
         payload = resp.json()
@@ -192,32 +337,154 @@ def search_github(query: str, limiter: RateLimiter, limit: int, token: Optional[
     return items
 
 
-def discover_all(
+DiscoveryTask = Tuple[str, Callable[..., List[SourceItem]]]
+
+
+def _host(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def plan_discovery(
     queries: Iterable[str],
     sources: dict,
-    limiter: RateLimiter,
-    limit: int,
     github_token: Optional[str],
-) -> List[SourceItem]:
-    items: List[SourceItem] = []
+    cursors: Optional[SourceCursors] = None,
+    batching: Optional[Dict[str, Any]] = None,
+) -> List[DiscoveryTask]:
+    tasks: List[DiscoveryTask] = []
 
     for query in queries:
-        items.extend(search_duckduckgo(query, limiter, limit))
-
-    for subreddit in sources.get("reddit", {}).get("subreddits", []):
-        for query in sources.get("reddit", {}).get("queries", []):
-            items.extend(search_reddit(subreddit, query, limiter, limit))
-
-    for query in sources.get("hackernews", {}).get("queries", []):
-        items.extend(search_hackernews(query, limiter, limit))
+        tasks.append(("duckduckgo.com", partial(search_duckduckgo, query)))
+
+    subreddits = sources.get("reddit", {}).get("subreddits", [])
+    reddit_queries = sources.get("reddit", {}).get("queries", [])
+    if batching is not None:
+        for path, expression, fan_in in plan_reddit(subreddits, reddit_queries, batching):
+            task = partial(search_reddit, path, expression, cursors=cursors, fan_in=fan_in)
+            tasks.append(("www.reddit.com", task))
+    else:
+        for subreddit in subreddits:
+            for query in reddit_queries:
+                task = partial(search_reddit, subreddit, query, cursors=cursors)
+                tasks.append(("www.reddit.com", task))
+
+    hn_queries = sources.get("hackernews", {}).get("queries", [])
+    if batching is not None:
+        for group in plan_hackernews(hn_queries, batching):
+            tasks.append(
+                ("hn.algolia.com", partial(search_hackernews_merged, group, cursors=cursors))
+            )
+    else:
+        for query in hn_queries:
+            tasks.append(("hn.algolia.com", partial(search_hackernews, query, cursors=cursors)))
 
     for feed_url in sources.get("producthunt", {}).get("rss_feeds", []):
-        items.extend(search_producthunt_rss(feed_url, limiter, limit))
+        tasks.append((_host(feed_url), partial(search_producthunt_rss, feed_url)))
 
     for url in sources.get("directories", []):
-        items.extend(scrape_directory(url, limiter, limit))
+        tasks.append((_host(url), partial(scrape_directory, url)))
 
-    for query in sources.get("github", {}).get("queries", []):
-        items.extend(search_github(query, limiter, limit, github_token))
+    if github_token:
+        for query in sources.get("github", {}).get("queries", []):
+            tasks.append(("api.github.com", partial(search_github, query, token=github_token)))
 
-    return items
+    return tasks
+
+
+# How often a host worker blocked on a full result queue checks whether discovery stopped.
+QUEUE_POLL_SECONDS = 0.2
+
+TaskResult = Tuple[int, List[SourceItem], Optional[BaseException]]
+
+
+def _put(results: "queue.Queue[TaskResult]", entry: TaskResult, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            results.put(entry, timeout=QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_host_tasks(
+    tasks: List[Tuple[int, Callable[..., List[SourceItem]]]],
+    client: HttpClient,
+    limit: int,
+    results: "queue.Queue[TaskResult]",
+    stop: threading.Event,
+    deadline: Optional[float] = None,
+) -> None:
+    with client.until(deadline):
+        for index, task in tasks:
+            if stop.is_set():
+                return
+            try:
+                entry: TaskResult = (index, task(client, limit), None)
+            except Exception as exc:
+                entry = (index, [], exc)
+            if not _put(results, entry, stop):
+                return
+
+
+def iter_task_results(
+    tasks: List[DiscoveryTask],
+    client: HttpClient,
+    limit: int,
+    workers: int = 1,
+    deadline: Optional[float] = None,
+) -> Iterator[Tuple[int, List[SourceItem]]]:
+    # Past `deadline` (a time.monotonic() value) results stop early: requests no longer
+    # wait on paused hosts, and nothing waits for a host that is still busy.
+    if workers <= 1 or len(tasks) <= 1:
+        for index, (_, task) in enumerate(tasks):
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            with client.until(deadline):
+                found = task(client, limit)
+            yield index, found
+        return
+
+    by_host: Dict[str, List[Tuple[int, Callable[..., List[SourceItem]]]]] = OrderedDict()
+    for index, (host, task) in enumerate(tasks):
+        by_host.setdefault(host, []).append((index, task))
+    logging.debug("Discovery fanned out across %s hosts", len(by_host))
+
+    workers = min(workers, len(by_host))
+    # Bounded: while the consumer is busy verifying, host workers wait with at most one
+    # finished page each instead of piling up every result in memory.
+    results: "queue.Queue[TaskResult]" = queue.Queue(maxsize=workers)
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for host_tasks in by_host.values():
+            executor.submit(_run_host_tasks, host_tasks, client, limit, results, stop, deadline)
+        for _ in tasks:
+            try:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                index, found, error = results.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if error is not None:
+                raise error
+            yield index, found
+    finally:
+        stop.set()
+        # A request already in flight is not waited for either.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_discover(
+    queries: Iterable[str],
+    sources: dict,
+    client: HttpClient,
+    limit: int,
+    github_token: Optional[str],
+    workers: int = 1,
+    cursors: Optional[SourceCursors] = None,
+    batching: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[SourceItem]:
+    tasks = plan_discovery(queries, sources, github_token, cursors, batching)
+    for _, found in iter_task_results(tasks, client, limit, workers, deadline):
+        yield from found
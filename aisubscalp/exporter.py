@@ -1,24 +1,114 @@
 from __future__ import annotations
 
 import csv
+import gzip
+import json
+import os
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, Optional, Sequence, TextIO
 
-from .utils import to_json
+EXPORT_FIELDS = [
+    "app_name",
+    "website_url",
+    "promo_type",
+    "trial_length",
+    "requirements",
+    "promo_code",
+    "source_urls",
+    "date_found",
+    "category",
+    "notes",
+    "verification_status",
+    "verification_notes",
+]
 
+DELTA_FIELDS = EXPORT_FIELDS + ["change", "last_changed"]
 
-def export_json(records: List[dict], path: Path) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(to_json(records), encoding="utf-8")
+EXPORT_FORMATS = ["json", "ndjson", "csv"]
 
 
-def export_csv(records: List[dict], path: Path) -> None:
+@contextmanager
+def atomic_writer(
+    path: Path, compress: bool = False, newline: Optional[str] = None
+) -> Iterator[TextIO]:
     path.parent.mkdir(parents=True, exist_ok=True)
-    if not records:
-        path.write_text("", encoding="utf-8")
-        return
-    with path.open("w", encoding="utf-8", newline="") as handle:
-        writer = csv.DictWriter(handle, fieldnames=list(records[0].keys()))
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    tmp_path.chmod(0o644)
+    try:
+        if compress:
+            handle = gzip.open(tmp_path, "wt", encoding="utf-8", newline=newline)
+        else:
+            handle = tmp_path.open("w", encoding="utf-8", newline=newline)
+        with handle:
+            yield handle
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _project(record: dict, fields: Sequence[str]) -> dict:
+    return {field: record.get(field) for field in fields}
+
+
+def export_json(
+    records: Iterable[dict],
+    path: Path,
+    compress: bool = False,
+    fields: Sequence[str] = EXPORT_FIELDS,
+) -> int:
+    count = 0
+    with atomic_writer(path, compress) as handle:
+        for record in records:
+            body = json.dumps(_project(record, fields), indent=2, ensure_ascii=True)
+            handle.write("[\n  " if count == 0 else ",\n  ")
+            handle.write(body.replace("\n", "\n  "))
+            count += 1
+        handle.write("\n]" if count else "[]")
+    return count
+
+
+def export_ndjson(
+    records: Iterable[dict],
+    path: Path,
+    compress: bool = False,
+    fields: Sequence[str] = EXPORT_FIELDS,
+) -> int:
+    count = 0
+    with atomic_writer(path, compress) as handle:
+        for record in records:
+            handle.write(json.dumps(_project(record, fields), ensure_ascii=True))
+            handle.write("\n")
+            count += 1
+    return count
+
+
+def export_csv(
+    records: Iterable[dict],
+    path: Path,
+    compress: bool = False,
+    fields: Sequence[str] = EXPORT_FIELDS,
+) -> int:
+    count = 0
+    with atomic_writer(path, compress, newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(fields), extrasaction="ignore")
         writer.writeheader()
-        for row in records:
-            writer.writerow(row)
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    return count
+
+
+def export_records(
+    records: Iterable[dict],
+    path: Path,
+    fmt: str = "json",
+    compress: bool = False,
+    fields: Sequence[str] = EXPORT_FIELDS,
+) -> int:
+    exporters = {"json": export_json, "ndjson": export_ndjson, "csv": export_csv}
+    return exporters[fmt](records, path, compress, fields)
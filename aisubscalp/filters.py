@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass
-from typing import Optional, Tuple
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from .matcher import Hits, PhraseMatcher
+from .utils import map_chunks, usable_cpus
 
 AI_KEYWORDS = [
     "ai",
@@ -45,11 +48,31 @@ REFERRAL_SIGNALS = [
     "invite friends",
 ]
 
+FIRST_TIME_SIGNALS = [
+    "first-time",
+    "new customer",
+]
+
+SIGNAL_GROUPS = {
+    "ai": AI_KEYWORDS,
+    "free": FREE_SIGNALS,
+    "open_source": OPEN_SOURCE_SIGNALS,
+    "student": STUDENT_SIGNALS,
+    "referral": REFERRAL_SIGNALS,
+    "first_time": FIRST_TIME_SIGNALS,
+    # Both discount regexes need a literal "%", so texts without one skip them.
+    "percent": ["%"],
+}
+SIGNAL_MATCHER = PhraseMatcher(SIGNAL_GROUPS)
+
 DISCOUNT_REGEX = re.compile(r"\b([1-9][0-9]?)%\s*(off|discount)\b")
 SAVE_REGEX = re.compile(r"\bsave\s+[1-9][0-9]?%")
 TRIAL_REGEX = re.compile(r"\b(\d{1,2})\s*(day|week|month)s?\b")
 PROMO_CODE_REGEX = re.compile(r"\b[A-Z0-9]{6,16}\b")
 
+BATCH_CHUNK_SIZE = 5_000
+BATCH_PARALLEL_MIN = 20_000
+
 
 @dataclass
 class FilterResult:
@@ -58,14 +81,46 @@ class FilterResult:
     promo_type: Optional[str]
     trial_length: Optional[str]
     promo_code: Optional[str]
+    hits: Optional[Hits] = field(default=None, repr=False, compare=False)
 
 
-def _contains_any(text: str, keywords: list[str]) -> bool:
-    return any(keyword in text for keyword in keywords)
-
-
-def _contains_discount(text: str) -> bool:
-    if "100% off" in text:
+@dataclass
+class FilterBatch:
+    allowed: List[bool] = field(default_factory=list)
+    reasons: List[str] = field(default_factory=list)
+    promo_types: List[Optional[str]] = field(default_factory=list)
+    trial_lengths: List[Optional[str]] = field(default_factory=list)
+    promo_codes: List[Optional[str]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.allowed)
+
+    def append(self, result: FilterResult) -> None:
+        self.allowed.append(result.allowed)
+        self.reasons.append(result.reason)
+        self.promo_types.append(result.promo_type)
+        self.trial_lengths.append(result.trial_length)
+        self.promo_codes.append(result.promo_code)
+
+    def extend(self, other: FilterBatch) -> None:
+        self.allowed.extend(other.allowed)
+        self.reasons.extend(other.reasons)
+        self.promo_types.extend(other.promo_types)
+        self.trial_lengths.extend(other.trial_lengths)
+        self.promo_codes.extend(other.promo_codes)
+
+    def result(self, index: int) -> FilterResult:
+        return FilterResult(
+            self.allowed[index],
+            self.reasons[index],
+            self.promo_types[index],
+            self.trial_lengths[index],
+            self.promo_codes[index],
+        )
+
+
+def _contains_discount(text: str, hits: Hits) -> bool:
+    if "100% off" in hits or "percent" not in hits.groups:
         return False
     return bool(DISCOUNT_REGEX.search(text) or SAVE_REGEX.search(text))
 
@@ -88,43 +143,69 @@ def extract_promo_code(text: str) -> Optional[str]:
     return None
 
 
-def detect_promo_type(text: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
-    if _contains_any(text, OPEN_SOURCE_SIGNALS):
+def detect_promo_type(
+    text: str, hits: Optional[Hits] = None
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    hits = hits or SIGNAL_MATCHER.scan(text)
+    if "open_source" in hits.groups:
         return "Open-Source", None, None
-    if "free trial" in text or "try free" in text:
+    if "free trial" in hits or "try free" in hits:
         return "Free Trial", extract_trial_length(text), None
-    if "100% off" in text:
+    if "100% off" in hits:
         return "100% Off", None, extract_promo_code(text)
-    if "limited time free" in text:
+    if "limited time free" in hits:
         return "Free (Limited Time)", None, None
-    if "free credits" in text:
+    if "free credits" in hits:
         return "Free Credits", None, None
-    if "free plan" in text or "free tier" in text or "free forever" in text:
+    if "free plan" in hits or "free tier" in hits or "free forever" in hits:
         return "Free", None, None
-    if "free to use" in text:
+    if "free to use" in hits:
         return "Free", None, None
     return None, None, None
 
 
-def apply_filters(text: str) -> FilterResult:
+def apply_filters(text: str, matcher: PhraseMatcher = SIGNAL_MATCHER) -> FilterResult:
     lowered = text.lower()
-    if not _contains_any(lowered, AI_KEYWORDS):
-        return FilterResult(False, "Not AI-related", None, None, None)
-    if _contains_any(lowered, STUDENT_SIGNALS):
-        return FilterResult(False, "Student-only offer", None, None, None)
-    if _contains_any(lowered, REFERRAL_SIGNALS):
-        return FilterResult(False, "Referral requirement", None, None, None)
-    if _contains_discount(lowered):
-        return FilterResult(False, "Non-100% discount detected", None, None, None)
-    if not (_contains_any(lowered, FREE_SIGNALS) or _contains_any(lowered, OPEN_SOURCE_SIGNALS)):
-        return FilterResult(False, "No free/open-source signal", None, None, None)
-
-    promo_type, trial_length, promo_code = detect_promo_type(lowered)
+    hits = matcher.scan(lowered)
+    if "ai" not in hits.groups:
+        return FilterResult(False, "Not AI-related", None, None, None, hits)
+    if "student" in hits.groups:
+        return FilterResult(False, "Student-only offer", None, None, None, hits)
+    if "referral" in hits.groups:
+        return FilterResult(False, "Referral requirement", None, None, None, hits)
+    if _contains_discount(lowered, hits):
+        return FilterResult(False, "Non-100% discount detected", None, None, None, hits)
+    if not ("free" in hits.groups or "open_source" in hits.groups):
+        return FilterResult(False, "No free/open-source signal", None, None, None, hits)
+
+    promo_type, trial_length, promo_code = detect_promo_type(lowered, hits)
     if not promo_type:
-        return FilterResult(False, "Unable to classify promo type", None, None, None)
+        return FilterResult(False, "Unable to classify promo type", None, None, None, hits)
 
-    if "first-time" in lowered or "new customer" in lowered:
+    if "first_time" in hits.groups:
         if promo_type not in {"Free Trial", "100% Off"}:
-            return FilterResult(False, "First-time only restriction", None, None, None)
-
-    return FilterResult(True, "Accepted", promo_type, trial_length, promo_code)
+            return FilterResult(False, "First-time only restriction", None, None, None, hits)
+
+    return FilterResult(True, "Accepted", promo_type, trial_length, promo_code, hits)
+
+
+def _filter_chunk(texts: Sequence[str]) -> FilterBatch:
+    batch = FilterBatch()
+    for text in texts:
+        batch.append(apply_filters(text))
+    return batch
+
+
+def apply_filters_batch(
+    texts: Sequence[str],
+    workers: Optional[int] = None,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    parallel_min: int = BATCH_PARALLEL_MIN,
+) -> FilterBatch:
+    workers = workers or usable_cpus()
+    if len(texts) < parallel_min or workers < 2:
+        return _filter_chunk(texts)
+    batch = FilterBatch()
+    for part in map_chunks(_filter_chunk, texts, chunk_size, workers):
+        batch.extend(part)
+    return batch
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+
+SCHEMA = """
+create table if not exists responses (
+    url text primary key,
+    etag text,
+    last_modified text,
+    body blob not null,
+    items text,
+    size integer not null,
+    fetched_at real not null,
+    accessed_at real not null
+);
+create index if not exists responses_accessed on responses (accessed_at);
+"""
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body: str
+    items: Optional[List[Dict[str, Any]]]
+    fetched_at: float
+
+
+class HttpCache:
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: Optional[Dict[str, float]] = None,
+        default_ttl: float = 0.0,
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds or {}
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, path: Path, settings: Dict[str, Any]) -> "HttpCache":
+        return cls(
+            path,
+            max_bytes=int(settings.get("max_mb", 64) * 1024 * 1024),
+            ttl_seconds=settings.get("ttl_seconds", {}),
+            default_ttl=settings.get("default_ttl_seconds", 0.0),
+        )
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "select etag, last_modified, body, items, fetched_at from responses where url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "update responses set accessed_at = ? where url = ?", (time.time(), url)
+            )
+            self._conn.commit()
+        etag, last_modified, body, items, fetched_at = row
+        return CacheEntry(
+            url=url,
+            etag=etag,
+            last_modified=last_modified,
+            body=zlib.decompress(body).decode("utf-8"),
+            items=json.loads(items) if items is not None else None,
+            fetched_at=fetched_at,
+        )
+
+    def is_fresh(self, entry: CacheEntry, source: str) -> bool:
+        ttl = self.ttl_seconds.get(source, self.default_ttl)
+        fresh = time.time() - entry.fetched_at < ttl
+        if fresh:
+            with self._lock:
+                self.hits += 1
+        return fresh
+
+    @staticmethod
+    def validators(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def refresh(self, url: str, response: requests.Response) -> None:
+        now = time.time()
+        with self._lock:
+            self.revalidated += 1
+            self._conn.execute(
+                """
+                update responses set
+                    etag = coalesce(?, etag),
+                    last_modified = coalesce(?, last_modified),
+                    fetched_at = ?,
+                    accessed_at = ?
+                where url = ?
+                """,
+                (
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now,
+                    now,
+                    url,
+                ),
+            )
+            self._conn.commit()
+
+    def store(
+        self, url: str, response: requests.Response, items: Optional[List[Dict[str, Any]]]
+    ) -> None:
+        body = zlib.compress(response.text.encode("utf-8"))
+        items_json = json.dumps(items, ensure_ascii=True) if items is not None else None
+        size = len(body) + len(items_json or "")
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                insert or replace into responses (
+                    url, etag, last_modified, body, items, size, fetched_at, accessed_at
+                ) values (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    url,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    body,
+                    items_json,
+                    size,
+                    now,
+                    now,
+                ),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("select coalesce(sum(size), 0) from responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for url, size in self._conn.execute(
+            "select url, size from responses order by accessed_at asc"
+        ):
+            if total <= self.max_bytes:
+                break
+            stale.append((url,))
+            total -= size
+        self._conn.executemany("delete from responses where url = ?", stale)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
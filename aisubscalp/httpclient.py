@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+from .httpcache import HttpCache
+from .ratelimit import HostRateLimiter
+from .utils import pick_user_agent
+
+
+class DeadlineExceeded(requests.Timeout):
+    pass
+
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, *args: Any, **kwargs: Any):
+        self._stats_lock = threading.Lock()
+        self._retired_connections = 0
+        self._retired_requests = 0
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        pools = self.poolmanager.pools
+        dispose = pools.dispose_func
+
+        def retire(pool: Any) -> None:
+            with self._stats_lock:
+                self._retired_connections += pool.num_connections
+                self._retired_requests += pool.num_requests
+            if dispose:
+                dispose(pool)
+
+        pools.dispose_func = retire
+
+    def connection_stats(self) -> Tuple[int, int, int]:
+        pools = self.poolmanager.pools
+        with self._stats_lock:
+            connections = self._retired_connections
+            requests_sent = self._retired_requests
+        live = [pools[key] for key in pools.keys() if key in pools]
+        connections += sum(pool.num_connections for pool in live)
+        requests_sent += sum(pool.num_requests for pool in live)
+        return connections, requests_sent, len(live)
+
+
+class HttpClient:
+    def __init__(
+        self,
+        limiter: HostRateLimiter,
+        pool_connections: int = 32,
+        pool_maxsize: int = 8,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 20.0,
+        cache: Optional[HttpCache] = None,
+    ):
+        self.limiter = limiter
+        self.cache = cache
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = PooledAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(
+        cls, http: Dict[str, Any], limiter: HostRateLimiter, cache: Optional[HttpCache] = None
+    ) -> "HttpClient":
+        return cls(limiter, cache=cache, **http)
+
+    def get(
+        self,
+        url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float | Tuple[float, float]] = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        request_headers = {"User-Agent": pick_user_agent()}
+        request_headers.update(headers or {})
+        if not self.limiter.wait(url, getattr(self._local, "deadline", None)):
+            raise DeadlineExceeded(f"Deadline reached before {url} could be requested")
+        with self._lock:
+            self._requests += 1
+        try:
+            response = self.session.get(
+                url, headers=request_headers, timeout=timeout or self.timeout, stream=stream
+            )
+        except requests.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+        self.limiter.observe(url, response)
+        return response
+
+    @contextmanager
+    def until(self, deadline: Optional[float]) -> Iterator[None]:
+        # Requests this thread makes inside the block fail with DeadlineExceeded instead of
+        # waiting on the rate limiter past `deadline` (a time.monotonic() value).
+        previous = getattr(self._local, "deadline", None)
+        self._local.deadline = deadline
+        try:
+            yield
+        finally:
+            self._local.deadline = previous
+
+    def stats(self) -> Dict[str, int]:
+        connections, sent, hosts = self.adapter.connection_stats()
+        with self._lock:
+            requests_made, errors = self._requests, self._errors
+        return {
+            "requests": requests_made,
+            "errors": errors,
+            "connections_opened": connections,
+            "connections_reused": max(sent - connections, 0),
+            "host_pools": hosts,
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logging.info(
+            "HTTP: %s requests, %s connections opened, %s reused, %s errors",
+            stats["requests"],
+            stats["connections_opened"],
+            stats["connections_reused"],
+            stats["errors"],
+        )
+        if self.cache:
+            logging.info(
+                "HTTP cache: %s fresh hits, %s revalidated (304), %s misses",
+                self.cache.hits,
+                self.cache.revalidated,
+                self.cache.misses,
+            )
+
+    def close(self) -> None:
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self) -> "HttpClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
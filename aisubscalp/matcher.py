@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, FrozenSet, Iterable, Mapping, Optional, Set
+
+MEMO_SIZE = 4096
+
+
+class Hits:
+    __slots__ = ("phrases", "groups", "matcher")
+
+    def __init__(self, phrases: FrozenSet[str], groups: FrozenSet[str], matcher: PhraseMatcher):
+        self.phrases = phrases
+        self.groups = groups
+        self.matcher = matcher
+
+    def __contains__(self, phrase: str) -> bool:
+        return phrase in self.phrases
+
+    def __repr__(self) -> str:
+        return f"Hits(phrases={sorted(self.phrases)}, groups={sorted(self.groups)})"
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy optional suffix: the longest phrase starting here wins.
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class PhraseMatcher:
+    def __init__(self, groups: Mapping[str, Iterable[str]]):
+        self.groups: Dict[str, FrozenSet[str]] = {
+            name: frozenset(phrases) for name, phrases in groups.items()
+        }
+        owners: Dict[str, Set[str]] = {}
+        for name, phrases in self.groups.items():
+            for phrase in phrases:
+                owners.setdefault(phrase, set()).add(name)
+        phrases = sorted(phrase for phrase in owners if phrase)
+        # Substring semantics with an empty phrase: it is in every text.
+        empty = frozenset([""]) if "" in owners else frozenset()
+        self._always = Hits(empty, frozenset(owners.get("", ())), self)
+        self._search: Optional[Callable[..., Optional[re.Match]]] = None
+        if phrases:
+            self._search = re.compile(_trie_pattern(phrases)).search
+        # The trie reports only the longest phrase per offset; every shorter phrase that
+        # is a prefix of it matched at the same offset too.
+        self._closure: Dict[str, Hits] = {}
+        self._memo: Dict[FrozenSet[str], Hits] = {}
+        for phrase in phrases:
+            covered = empty | {other for other in phrases if phrase.startswith(other)}
+            names = set(self._always.groups)
+            for other in covered:
+                names |= owners[other]
+            self._closure[phrase] = Hits(frozenset(covered), frozenset(names), self)
+
+    def scan(self, lowered: str) -> Hits:
+        if self._search is None:
+            return self._always
+        # Restart one character past each hit so overlapping phrases are all seen; the
+        # compiled search skips ahead to the next possible first character on its own.
+        found = []
+        match = self._search(lowered)
+        while match is not None:
+            found.append(match.group())
+            match = self._search(lowered, match.start() + 1)
+        if not found:
+            return self._always
+        if len(found) == 1:
+            return self._closure[found[0]]
+        # Texts from one source repeat the same few combinations, so the merged sets are
+        # memoized on the raw hits.
+        key = frozenset(found)
+        hits = self._memo.get(key)
+        if hits is None:
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            hits = self._memo[key] = self._merge(key)
+        return hits
+
+    def _merge(self, found: FrozenSet[str]) -> Hits:
+        phrases: Set[str] = set()
+        groups: Set[str] = set()
+        for phrase in found:
+            phrases |= self._closure[phrase].phrases
+            groups |= self._closure[phrase].groups
+        return Hits(frozenset(phrases), frozenset(groups), self)
@@ -17,6 +17,7 @@ class SourceItem:
     snippet: str = ""
     category: str = "Unknown"
     discovered_at: str = field(default_factory=utc_now_iso)
+    source_urls: List[str] = field(default_factory=list)
 
 
 @dataclass
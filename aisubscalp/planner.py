@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from functools import partial
+from typing import Any, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+REDDIT_MAX_LIMIT = 100
+
+
+def _groups(values: Sequence[T], size: int) -> List[List[T]]:
+    size = max(int(size), 1)
+    return [list(values[start : start + size]) for start in range(0, len(values), size)]
+
+
+def _quote_term(term: str) -> str:
+    term = term.strip()
+    if " " in term and not term.startswith('"'):
+        return f'"{term}"'
+    return term
+
+
+def or_query(queries: Sequence[str]) -> str:
+    if len(queries) == 1:
+        return queries[0]
+    return " OR ".join(_quote_term(query) for query in queries)
+
+
+def plan_reddit(
+    subreddits: Sequence[str], queries: Sequence[str], settings: Dict[str, Any]
+) -> List[Tuple[str, str, int]]:
+    sub_groups = _groups(subreddits, settings.get("reddit_subreddits_per_request", 10))
+    query_groups = _groups(queries, settings.get("reddit_queries_per_request", 5))
+    return [
+        ("+".join(subs), or_query(terms), len(subs) * len(terms))
+        for subs in sub_groups
+        for terms in query_groups
+    ]
+
+
+def query_words(query: str) -> Tuple[str, ...]:
+    return tuple(sorted(set(query.lower().split())))
+
+
+def plan_hackernews(queries: Sequence[str], settings: Dict[str, Any]) -> List[List[str]]:
+    # Algolia's optionalWords do not filter search_by_date results, so a merged request only
+    # stays as narrow as its parts when they all require the same words.
+    by_words: Dict[Tuple[str, ...], List[str]] = {}
+    for query in queries:
+        by_words.setdefault(query_words(query), []).append(query)
+    size = settings.get("hackernews_queries_per_request", 3)
+    return [group for same in by_words.values() for group in _groups(same, size)]
+
+
+def describe_task(host: str, task: Callable[..., Any]) -> str:
+    if not isinstance(task, partial):
+        return f"{host}  {getattr(task, '__name__', repr(task))}"
+    args = " | ".join(
+        ", ".join(arg) if isinstance(arg, (list, tuple)) else str(arg) for arg in task.args
+    )
+    return f"{host}  {task.func.__name__}: {args}"
+
+
+def format_plan(tasks: Sequence[Tuple[str, Callable[..., Any]]]) -> str:
+    lines = [describe_task(host, task) for host, task in tasks]
+    hosts = len({host for host, _ in tasks})
+    lines.append(f"{len(tasks)} requests across {hosts} hosts")
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+DEFAULT_BACKOFF_SECONDS = 30.0
+MAX_BACKOFF_SECONDS = 900.0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1, jitter: float = 0.0):
+        self.rate = max(rate, 1e-6)
+        self.burst = max(int(burst), 1)
+        self.jitter = max(jitter, 0.0)
+        self._interval = 1.0 / self.rate
+        self._tolerance = (self.burst - 1) * self._interval
+        self._tat = 0.0
+        self._strikes = 0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._tat - self._tolerance)
+            self._tat = max(self._tat, start) + self._interval
+        jitter = random.uniform(0.0, self.jitter) if self.jitter else 0.0
+        return start - now + jitter
+
+    def block_for(self, seconds: float) -> None:
+        with self._lock:
+            until = time.monotonic() + min(max(seconds, 0.0), MAX_BACKOFF_SECONDS)
+            self._tat = max(self._tat, until + self._tolerance)
+
+    def penalize(self, retry_after: Optional[float]) -> float:
+        with self._lock:
+            self._strikes += 1
+            strikes = self._strikes
+        if retry_after is None:
+            retry_after = DEFAULT_BACKOFF_SECONDS * 2 ** (strikes - 1)
+        self.block_for(retry_after)
+        return min(retry_after, MAX_BACKOFF_SECONDS)
+
+    def reset_strikes(self) -> None:
+        with self._lock:
+            self._strikes = 0
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_reset(remaining: Optional[str], reset: Optional[str]) -> Optional[float]:
+    if remaining is None or reset is None:
+        return None
+    try:
+        if int(remaining) > 0:
+            return None
+        return max(float(reset) - time.time(), 0.0)
+    except ValueError:
+        return None
+
+
+class HostRateLimiter:
+    def __init__(
+        self,
+        rate: float = 0.5,
+        burst: int = 1,
+        jitter: float = 0.0,
+        hosts: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        self.default = {"rate": rate, "burst": burst, "jitter": jitter}
+        self.hosts = {key.lower(): value for key, value in (hosts or {}).items()}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls, rate_limits: Dict[str, Any], rate_limit_seconds: list[float]
+    ) -> "HostRateLimiter":
+        min_delay, max_delay = rate_limit_seconds
+        default = {
+            "rate": 1.0 / max(min_delay, 1e-3),
+            "burst": 1,
+            "jitter": max(max_delay - min_delay, 0.0),
+        }
+        default.update(rate_limits.get("default", {}))
+        return cls(hosts=rate_limits.get("hosts", {}), **default)
+
+    def _key(self, url: str) -> str:
+        host = (urlparse(url).hostname or url).lower()
+        for key in self.hosts:
+            if host == key or host.endswith("." + key):
+                return key
+        return host
+
+    def bucket(self, url: str) -> TokenBucket:
+        key = self._key(url)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                settings = dict(self.default)
+                settings.update(self.hosts.get(key, {}))
+                bucket = TokenBucket(settings["rate"], settings["burst"], settings["jitter"])
+                self._buckets[key] = bucket
+            return bucket
+
+    def reserve(self, url: str) -> float:
+        return self.bucket(url).reserve()
+
+    def wait(self, url: str, deadline: Optional[float] = None) -> bool:
+        delay = self.reserve(url)
+        # A host paused for minutes is not waited for past the caller's deadline.
+        if deadline is not None and time.monotonic() + delay > deadline:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def observe(self, url: str, response: requests.Response) -> None:
+        bucket = self.bucket(url)
+        headers = response.headers
+        retry_after = _parse_retry_after(headers.get("Retry-After"))
+        if response.status_code == 429 or (response.status_code == 503 and retry_after):
+            paused = bucket.penalize(retry_after)
+            logging.info(
+                "HTTP %s from %s; pausing host for %.0fs",
+                response.status_code,
+                self._key(url),
+                paused,
+            )
+            return
+        bucket.reset_strikes()
+        if retry_after:
+            bucket.block_for(retry_after)
+            return
+        reset_in = _parse_reset(
+            headers.get("X-RateLimit-Remaining"), headers.get("X-RateLimit-Reset")
+        )
+        if reset_in is not None:
+            logging.info("Rate limit exhausted for %s; resuming in %.0fs", self._key(url), reset_in)
+            bucket.block_for(reset_in)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+from dataclasses import dataclass, replace
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .archive import CandidateArchive
+from .canonical import canonicalize_url, merge_candidates
+from .config import AppConfig
+from .models import Deal, SourceItem, utc_now_iso
+from .scan import assemble_deal, build_matcher, classify, normalize_url
+from .storage import bulk_upsert_deals, find_deals, get_verification, remove_deals
+from .utils import map_chunks, usable_cpus
+
+OFFLINE = ("Pending", "Not verified yet (found by rescore)")
+RESCORE_CHUNK_SIZE = 2_000
+
+
+@dataclass
+class RescoreStats:
+    candidates: int = 0
+    deals: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+
+def _rescore_chunk(groups: Sequence[List[SourceItem]], config: AppConfig) -> List[Optional[Deal]]:
+    matcher = build_matcher(config.keywords)
+    deals: List[Optional[Deal]] = []
+    for sightings in groups:
+        # Same as a streaming scan: sightings are merged into the URL's text until one is
+        # accepted; later ones only add their source URLs.
+        item, classified = sightings[0], classify(sightings[0], matcher)
+        for later in sightings[1:]:
+            if classified is None:
+                item = merge_candidates([item, later])[0]
+                classified = classify(item, matcher)
+            else:
+                item.source_urls.extend(
+                    url for url in later.source_urls if url not in item.source_urls
+                )
+        if classified is None:
+            deals.append(None)
+            continue
+        text_blob, result = classified
+        deals.append(assemble_deal(item, text_blob, result, config, OFFLINE))
+    return deals
+
+
+def _sightings(run: List[SourceItem]) -> List[List[SourceItem]]:
+    by_url: Dict[str, List[SourceItem]] = {}
+    for item in run:
+        merged = merge_candidates([item])[0]
+        by_url.setdefault(merged.url, []).append(merged)
+    return list(by_url.values())
+
+
+def _known_verification(
+    conn: sqlite3.Connection, item: SourceItem, deal: Deal
+) -> Tuple[str, Optional[str]]:
+    # Rescoring never touches the network: keep what the deal row or the verification
+    # cache already knows about this URL, whatever its age.
+    rows = find_deals(conn, deal.app_name, deal.website_url)
+    if rows:
+        same_type = [row for row in rows if row[0] == deal.promo_type]
+        _, status, notes = (same_type or rows)[0]
+        return status, notes
+    cached = get_verification(conn, canonicalize_url(item.url))
+    if cached is not None:
+        return cached[0], cached[1]
+    return OFFLINE
+
+
+def rescore(
+    conn: sqlite3.Connection,
+    config: AppConfig,
+    archive: CandidateArchive,
+    since: Optional[datetime] = None,
+    workers: Optional[int] = None,
+) -> RescoreStats:
+    stats = RescoreStats()
+    groups: List[List[SourceItem]] = []
+    run_of: List[int] = []
+    for index, run in enumerate(archive.iter_runs(since)):
+        by_url = _sightings(run)
+        groups.extend(by_url)
+        run_of.extend([index] * len(by_url))
+    stats.candidates = len(groups)
+    chunks = map_chunks(
+        partial(_rescore_chunk, config=config),
+        groups,
+        RESCORE_CHUNK_SIZE,
+        workers or usable_cpus(),
+    )
+    results = [deal for chunk in chunks for deal in chunk]
+
+    # Within a run the first deal for a key wins; a later run overwrites it, as a later
+    # scan's upsert would.
+    deals: Dict[tuple, Deal] = {}
+    winner_run: Dict[tuple, int] = {}
+    for sightings, deal, run in zip(groups, results, run_of, strict=True):
+        if deal is None:
+            continue
+        key = (deal.app_name, deal.promo_type, deal.website_url)
+        if winner_run.get(key) == run:
+            continue
+        status, notes = _known_verification(conn, sightings[0], deal)
+        deals[key] = replace(deal, verification_status=status, verification_notes=notes)
+        winner_run[key] = run
+    stats.deals = len(deals)
+
+    # Rows the archived candidates produced under rules that no longer accept them.
+    stale: Set[tuple] = set()
+    for item, *_ in groups:
+        app_name, website_url = item.title[:140], normalize_url(item.url)
+        for promo_type, _, _ in find_deals(conn, app_name, website_url):
+            if (app_name, promo_type, website_url) not in deals:
+                stale.add((app_name, promo_type, website_url))
+
+    upserted = bulk_upsert_deals(conn, deals.values(), touch_unchanged=False, reclassify=True)
+    stats.inserted, stats.updated, stats.unchanged = (
+        upserted.inserted,
+        upserted.updated,
+        upserted.unchanged,
+    )
+    stats.removed = remove_deals(conn, stale, utc_now_iso()) if stale else 0
+    logging.info(
+        "Rescored %s archived candidates: %s deals (%s inserted, %s updated, %s unchanged), "
+        "%s removed",
+        stats.candidates,
+        stats.deals,
+        stats.inserted,
+        stats.updated,
+        stats.unchanged,
+        stats.removed,
+    )
+    return stats
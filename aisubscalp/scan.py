@@ -2,30 +2,70 @@ from __future__ import annotations
 
 import logging
 import os
+import time
 from dataclasses import asdict
-from typing import Iterable, List
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse
 
+from .canonical import merge_candidates
 from .config import AppConfig
-from .filters import apply_filters
+from .filters import SIGNAL_GROUPS, FilterResult, apply_filters
+from .httpclient import HttpClient
+from .matcher import Hits, PhraseMatcher
 from .models import Deal, SourceItem, utc_now_iso
-from .utils import RateLimiter, unique_by
-from .verify import verify_url
+from .verify import OriginProber, VerificationCache, verify_many, verify_url
 
+REQUIREMENT_SIGNALS = {
+    "no_credit_card": ["no credit card"],
+    "signup": ["signup", "sign up"],
+}
+CATEGORY_PREFIX = "category:"
 
-def infer_category(text: str, keywords: dict) -> str:
-    lowered = text.lower()
-    for category, terms in keywords.get("categories", {}).items():
-        if any(term in lowered for term in terms):
+
+@lru_cache(maxsize=16)
+def _compile_matcher(categories: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> PhraseMatcher:
+    groups: Dict[str, Iterable[str]] = {**SIGNAL_GROUPS, **REQUIREMENT_SIGNALS}
+    groups.update((CATEGORY_PREFIX + name, terms) for name, terms in categories)
+    return PhraseMatcher(groups)
+
+
+_last_matcher: Tuple[Optional[dict], Optional[PhraseMatcher]] = (None, None)
+
+
+def build_matcher(keywords: dict) -> PhraseMatcher:
+    global _last_matcher
+    categories = keywords.get("categories", {})
+    # Config dicts are not mutated after loading, so the last one seen is matched by
+    # identity before paying for the cache key.
+    last, matcher = _last_matcher
+    if last is categories and matcher is not None:
+        return matcher
+    matcher = _compile_matcher(tuple((name, tuple(terms)) for name, terms in categories.items()))
+    _last_matcher = (categories, matcher)
+    return matcher
+
+
+def _hits_for(text: str, matcher: PhraseMatcher, hits: Optional[Hits]) -> Hits:
+    if hits is not None and hits.matcher is matcher:
+        return hits
+    return matcher.scan(text.lower())
+
+
+def infer_category(text: str, keywords: dict, hits: Optional[Hits] = None) -> str:
+    hits = _hits_for(text, build_matcher(keywords), hits)
+    for category in keywords.get("categories", {}):
+        if CATEGORY_PREFIX + category in hits.groups:
             return category
     return "Unknown"
 
 
-def infer_requirements(text: str) -> str | None:
-    lowered = text.lower()
-    if "no credit card" in lowered:
+def infer_requirements(text: str, hits: Optional[Hits] = None) -> str | None:
+    if hits is None or "signup" not in hits.matcher.groups:
+        hits = _compile_matcher(()).scan(text.lower())
+    if "no_credit_card" in hits.groups:
         return "No credit card required"
-    if "signup" in lowered or "sign up" in lowered:
+    if "signup" in hits.groups:
         return "Signup required"
     return None
 
@@ -37,18 +77,27 @@ def normalize_url(url: str) -> str:
     return f"{parsed.scheme}://{parsed.netloc}"
 
 
-def build_deal(item: SourceItem, config: AppConfig, limiter: RateLimiter) -> Deal | None:
+def classify(
+    item: SourceItem, matcher: Optional[PhraseMatcher] = None
+) -> Tuple[str, FilterResult] | None:
     text_blob = " ".join([item.title, item.snippet or "", item.url]).strip()
-    result = apply_filters(text_blob)
+    result = apply_filters(text_blob, matcher or _compile_matcher(()))
     if not result.allowed:
         logging.debug("Rejected: %s (%s)", item.title, result.reason)
         return None
-
-    verification_status, verification_notes = verify_url(
-        item.url, config.keywords["verification_keywords"], limiter
-    )
-    category = infer_category(text_blob, config.keywords)
-    requirements = infer_requirements(text_blob)
+    return text_blob, result
+
+
+def assemble_deal(
+    item: SourceItem,
+    text_blob: str,
+    result: FilterResult,
+    config: AppConfig,
+    verification: Tuple[str, Optional[str]],
+) -> Deal:
+    verification_status, verification_notes = verification
+    category = infer_category(text_blob, config.keywords, result.hits)
+    requirements = infer_requirements(text_blob, result.hits)
     notes = f"{item.source}: {item.title}"
 
     return Deal(
@@ -58,7 +107,7 @@ def build_deal(item: SourceItem, config: AppConfig, limiter: RateLimiter) -> Dea
         trial_length=result.trial_length,
         requirements=requirements,
         promo_code=result.promo_code,
-        source_urls=[item.url],
+        source_urls=item.source_urls or [item.url],
         date_found=utc_now_iso(),
         category=category,
         notes=notes,
@@ -67,13 +116,125 @@ def build_deal(item: SourceItem, config: AppConfig, limiter: RateLimiter) -> Dea
     )
 
 
-def build_deals(items: Iterable[SourceItem], config: AppConfig, limiter: RateLimiter) -> List[Deal]:
-    deals: List[Deal] = []
+def _verifier_fn(
+    config: AppConfig, client: HttpClient, verifier: Optional[VerificationCache]
+) -> Callable[[str], Tuple[str, Optional[str]]]:
+    keywords = config.keywords["verification_keywords"]
+    timeout = config.verification.get("request_timeout")
+    max_bytes = int(config.verification.get("max_body_kb", 1024) * 1024)
+    prober = None
+    if config.verification.get("probe_origins"):
+        prober = OriginProber.from_config(client, keywords, config.verification, max_bytes)
+    if verifier:
+        return lambda url: verifier.verify(url, keywords, client, timeout, max_bytes, prober)
+    return lambda url: verify_url(url, keywords, client, timeout, max_bytes, prober)
+
+
+def build_deal(
+    item: SourceItem,
+    config: AppConfig,
+    client: HttpClient,
+    verifier: Optional[VerificationCache] = None,
+) -> Deal | None:
+    classified = classify(item, build_matcher(config.keywords))
+    if not classified:
+        return None
+    text_blob, result = classified
+    verification = _verifier_fn(config, client, verifier)(item.url)
+    return assemble_deal(item, text_blob, result, config, verification)
+
+
+def build_deals(
+    items: Iterable[SourceItem],
+    config: AppConfig,
+    client: HttpClient,
+    verifier: Optional[VerificationCache] = None,
+) -> List[Deal]:
+    return list(stream_deals(items, config, client, verifier))
+
+
+def _extend_unique(target: List[str], values: Iterable[str]) -> None:
+    for value in values:
+        if value not in target:
+            target.append(value)
+
+
+def stream_deals(
+    items: Iterable[SourceItem],
+    config: AppConfig,
+    client: HttpClient,
+    verifier: Optional[VerificationCache] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[Deal]:
+    settings = config.verification
+    pipeline = config.pipeline
+    batch_size = pipeline.get("verify_batch_size", 16)
+    flush_seconds = pipeline.get("flush_seconds", 5.0)
+    check = _verifier_fn(config, client, verifier)
+    matcher = build_matcher(config.keywords)
+    stage_deadline = settings.get("stage_deadline_seconds")
+    stage_end: Optional[float] = None
+    by_url: Dict[str, Optional[Deal]] = {}
+    seen_keys: set = set()
+    buffer: List[Tuple[SourceItem, str, FilterResult]] = []
+    buffered: Dict[str, SourceItem] = {}
+    rejected: Dict[str, SourceItem] = {}
+    buffered_at = 0.0
+
+    def flush() -> Iterator[Deal]:
+        nonlocal stage_end
+        if stage_end is None and stage_deadline is not None:
+            stage_end = time.monotonic() + stage_deadline
+        if deadline is not None:
+            stage_end = deadline if stage_end is None else min(stage_end, deadline)
+        verifications = verify_many(
+            [item.url for item, _, _ in buffer],
+            check,
+            workers=settings.get("workers", 8),
+            per_host=settings.get("per_host", 2),
+            deadline=None if stage_end is None else stage_end - time.monotonic(),
+        )
+        for (item, text_blob, result), verification in zip(buffer, verifications, strict=True):
+            deal = assemble_deal(item, text_blob, result, config, verification)
+            key = (deal.app_name, deal.promo_type, deal.website_url)
+            if key in seen_keys:
+                by_url[item.url] = None
+                continue
+            seen_keys.add(key)
+            by_url[item.url] = deal
+            yield deal
+        buffer.clear()
+        buffered.clear()
+
     for item in items:
-        deal = build_deal(item, config, limiter)
-        if deal:
-            deals.append(deal)
-    return unique_by(deals, lambda d: (d.app_name, d.promo_type, d.website_url))
+        if buffer and time.monotonic() - buffered_at >= flush_seconds:
+            yield from flush()
+        merged = merge_candidates([item])[0]
+        if merged.url in by_url:
+            known = by_url[merged.url]
+            # Not yielded again: store_deals() writes deals whose sources grew once more at
+            # the end of the scan.
+            if known:
+                _extend_unique(known.source_urls, merged.source_urls)
+            continue
+        # Until a URL's deal is handed over, every sighting's title and snippet join its
+        # text and it is classified again, so a rejected first sighting is not final.
+        earlier = buffered.pop(merged.url, None) or rejected.pop(merged.url, None)
+        if earlier is not None:
+            merged = merge_candidates([earlier, merged])[0]
+            buffer[:] = [entry for entry in buffer if entry[0] is not earlier]
+        classified = classify(merged, matcher)
+        if not classified:
+            rejected[merged.url] = merged
+            continue
+        if not buffer:
+            buffered_at = time.monotonic()
+        buffer.append((merged, *classified))
+        buffered[merged.url] = merged
+        if len(buffer) >= batch_size:
+            yield from flush()
+    if buffer:
+        yield from flush()
 
 
 def to_dicts(deals: Iterable[Deal]) -> list[dict]:
@@ -1,16 +1,113 @@
 from __future__ import annotations
 
 import logging
+import random
+import threading
 import time
-from typing import Callable
-
-
-def run_schedule(task: Callable[[], None], interval_minutes: int) -> None:
-    logging.info("Scheduler started. Interval: %s minutes", interval_minutes)
-    while True:
-        start = time.time()
-        task()
-        elapsed = time.time() - start
-        sleep_for = max(interval_minutes * 60 - elapsed, 5)
-        logging.info("Next run in %.1f seconds", sleep_for)
-        time.sleep(sleep_for)
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+@dataclass
+class SourceJob:
+    name: str
+    interval: float
+    jitter: float = 0.0
+    deadline: Optional[float] = None
+    anchor: float = 0.0
+    next_run: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def schedule_next(self) -> None:
+        self.anchor += self.interval
+        self.next_run = self.anchor + (random.uniform(0.0, self.jitter) if self.jitter else 0.0)
+
+
+def jobs_from_config(
+    schedule: Dict[str, Any], names: Iterable[str], interval_minutes: Optional[float] = None
+) -> List[SourceJob]:
+    default = {"interval_minutes": 360, "jitter_seconds": 0, "deadline_minutes": None}
+    default.update(schedule.get("default", {}))
+    if interval_minutes:
+        default["interval_minutes"] = interval_minutes
+    jobs = []
+    for name in names:
+        settings = dict(default)
+        settings.update(schedule.get("sources", {}).get(name, {}))
+        deadline = settings["deadline_minutes"]
+        jobs.append(
+            SourceJob(
+                name=name,
+                interval=settings["interval_minutes"] * 60,
+                jitter=settings["jitter_seconds"],
+                deadline=deadline * 60 if deadline else None,
+            )
+        )
+    return jobs
+
+
+class SourceScheduler:
+    def __init__(
+        self,
+        jobs: List[SourceJob],
+        run_job: Callable[[SourceJob, Optional[float]], None],
+        max_workers: int = 4,
+    ):
+        self.jobs = jobs
+        self.run_job = run_job
+        self.executor = ThreadPoolExecutor(max_workers=max(max_workers, 1))
+        self.runs: Counter = Counter()
+        self.skipped: Counter = Counter()
+
+    def start(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for job in self.jobs:
+            job.anchor = now
+            job.next_run = now + (random.uniform(0.0, job.jitter) if job.jitter else 0.0)
+
+    def _run(self, job: SourceJob, deadline: Optional[float]) -> None:
+        try:
+            self.run_job(job, deadline)
+        except Exception:
+            logging.exception("Scheduled run of %s failed", job.name)
+        finally:
+            job.lock.release()
+
+    def run_pending(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        for job in self.jobs:
+            if job.next_run > now:
+                continue
+            while job.next_run <= now:
+                job.schedule_next()
+            if not job.lock.acquire(blocking=False):
+                self.skipped[job.name] += 1
+                logging.warning("Skipping %s: previous run still in flight", job.name)
+                continue
+            self.runs[job.name] += 1
+            deadline = now + job.deadline if job.deadline else None
+            logging.info("Running %s (next in %.0fs)", job.name, job.next_run - now)
+            self.executor.submit(self._run, job, deadline)
+        return max(min(job.next_run for job in self.jobs) - now, 0.0)
+
+    def replace_jobs(self, jobs: List[SourceJob]) -> None:
+        current = {job.name: job for job in self.jobs}
+        for job in jobs:
+            previous = current.get(job.name)
+            if previous is None:
+                job.anchor = job.next_run = time.monotonic()
+                continue
+            # Keep the lock so an in-flight run still blocks overlap, and re-anchor the next
+            # run on the last scheduled one using the new interval (and the same jitter).
+            job.lock = previous.lock
+            job.anchor = previous.anchor - previous.interval + job.interval
+            job.next_run = job.anchor + min(previous.next_run - previous.anchor, job.jitter)
+        self.jobs = jobs
+
+    def in_flight(self) -> int:
+        return sum(job.lock.locked() for job in self.jobs)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
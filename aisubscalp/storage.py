@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import sqlite3
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Iterable, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .models import Deal
+from .models import Deal, utc_now_iso
+from .utils import chunked
 
 
 SCHEMA = """
@@ -22,87 +25,521 @@ create table if not exists deals (
     category text not null,
     notes text not null,
     verification_status text not null,
-    verification_notes text
+    verification_notes text,
+    content_hash text,
+    first_seen text,
+    last_seen text,
+    last_changed text,
+    removed_at text
 );
 create unique index if not exists deals_unique
 on deals (app_name, promo_type, website_url);
+create index if not exists deals_date_found on deals (date_found, id);
+create index if not exists deals_category_date on deals (category, date_found, id);
+create index if not exists deals_promo_type_date on deals (promo_type, date_found, id);
+create index if not exists deals_status_date on deals (verification_status, date_found, id);
+create table if not exists verifications (
+    url text primary key,
+    status text not null,
+    notes text,
+    content_hash text,
+    verified_at text not null
+);
+create table if not exists export_watermarks (
+    target text primary key,
+    watermark text not null,
+    updated_at text not null
+);
+create table if not exists source_cursors (
+    source text not null,
+    query text not null,
+    cursor text not null,
+    updated_at text not null,
+    primary key (source, query)
+);
+"""
+
+
+PRAGMAS = (
+    "pragma journal_mode=WAL",
+    "pragma synchronous=NORMAL",
+    "pragma cache_size=-65536",
+    "pragma mmap_size=268435456",
+    "pragma temp_store=MEMORY",
+    "pragma busy_timeout=5000",
+)
+
+UPSERT_SQL = """
+insert into deals (
+    app_name, website_url, promo_type, trial_length, requirements,
+    promo_code, source_urls, date_found, category, notes,
+    verification_status, verification_notes, content_hash,
+    first_seen, last_seen, last_changed
+) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+on conflict(app_name, promo_type, website_url) do update set
+    trial_length=excluded.trial_length,
+    requirements=excluded.requirements,
+    promo_code=excluded.promo_code,
+    source_urls=excluded.source_urls,
+    category=excluded.category,
+    notes=excluded.notes,
+    verification_status=excluded.verification_status,
+    verification_notes=excluded.verification_notes,
+    content_hash=excluded.content_hash,
+    last_seen=excluded.last_seen,
+    last_changed=excluded.last_changed,
+    first_seen=case when deals.removed_at is null then deals.first_seen else excluded.first_seen end,
+    removed_at=null
+"""
+
+# Re-classifying stored candidates is not a new sighting, so last_seen is left alone.
+RECLASSIFY_SQL = UPSERT_SQL.replace("    last_seen=excluded.last_seen,\n", "")
+
+TOUCH_SQL = """
+update deals set
+    last_seen = ?,
+    last_changed = case when last_seen < ? then ? else last_changed end
+where app_name = ? and promo_type = ? and website_url = ?
+"""
+
+INDEXES = """
+create index if not exists deals_last_changed on deals (last_changed, id);
+create index if not exists deals_last_seen on deals (last_seen, id);
+create index if not exists deals_removed_at on deals (removed_at, id);
 """
 
+MIGRATIONS = {
+    "content_hash": "alter table deals add column content_hash text",
+    "first_seen": "alter table deals add column first_seen text",
+    "last_seen": "alter table deals add column last_seen text",
+    "last_changed": "alter table deals add column last_changed text",
+    "removed_at": "alter table deals add column removed_at text",
+}
+
+
+@dataclass
+class UpsertStats:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+    def __iadd__(self, other: "UpsertStats") -> "UpsertStats":
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        return self
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    columns = {row[1] for row in conn.execute("pragma table_info(deals)")}
+    missing = [sql for column, sql in MIGRATIONS.items() if column not in columns]
+    if not missing:
+        return
+    with conn:
+        for sql in missing:
+            conn.execute(sql)
+        conn.execute(
+            """
+            update deals set
+                first_seen = coalesce(first_seen, date_found),
+                last_seen = coalesce(last_seen, date_found),
+                last_changed = coalesce(last_changed, date_found)
+            """
+        )
+
 
 def init_db(path: Path) -> sqlite3.Connection:
     path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(path))
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.executescript(INDEXES)
     return conn
 
 
-def upsert_deals(conn: sqlite3.Connection, deals: Iterable[Deal]) -> int:
-    rows = 0
-    for deal in deals:
-        conn.execute(
+def deal_content_hash(deal: Deal) -> str:
+    # Discovery hosts finish in any order, so the order of source_urls and the sighting that
+    # wrote `notes` ("<source>: <title>") vary between identical scans; neither is content.
+    content = [
+        deal.trial_length,
+        deal.requirements,
+        deal.promo_code,
+        sorted(deal.source_urls),
+        deal.category,
+        deal.verification_status,
+        deal.verification_notes,
+    ]
+    encoded = json.dumps(content, ensure_ascii=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _deal_row(deal: Deal, content_hash: str, seen_at: str) -> tuple:
+    return (
+        deal.app_name,
+        deal.website_url,
+        deal.promo_type,
+        deal.trial_length,
+        deal.requirements,
+        deal.promo_code,
+        json.dumps(deal.source_urls, ensure_ascii=True),
+        deal.date_found,
+        deal.category,
+        deal.notes,
+        deal.verification_status,
+        deal.verification_notes,
+        content_hash,
+        seen_at,
+        seen_at,
+        seen_at,
+    )
+
+
+def _existing_rows(
+    conn: sqlite3.Connection, keys: Iterable[tuple]
+) -> Dict[tuple, Tuple[Optional[str], List[str]]]:
+    existing: Dict[tuple, Tuple[Optional[str], List[str]]] = {}
+    for key in keys:
+        row = conn.execute(
             """
-            insert into deals (
-                app_name, website_url, promo_type, trial_length, requirements,
-                promo_code, source_urls, date_found, category, notes,
-                verification_status, verification_notes
-            ) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            on conflict(app_name, promo_type, website_url) do update set
-                trial_length=excluded.trial_length,
-                requirements=excluded.requirements,
-                promo_code=excluded.promo_code,
-                source_urls=excluded.source_urls,
-                date_found=excluded.date_found,
-                category=excluded.category,
-                notes=excluded.notes,
-                verification_status=excluded.verification_status,
-                verification_notes=excluded.verification_notes
+            select content_hash, source_urls from deals
+            where app_name = ? and promo_type = ? and website_url = ? and removed_at is null
             """,
-            (
-                deal.app_name,
-                deal.website_url,
-                deal.promo_type,
-                deal.trial_length,
-                deal.requirements,
-                deal.promo_code,
-                json.dumps(deal.source_urls, ensure_ascii=True),
-                deal.date_found,
-                deal.category,
-                deal.notes,
-                deal.verification_status,
-                deal.verification_notes,
-            ),
+            key,
+        ).fetchone()
+        # A removed row found again is written like a new one (and reported as added).
+        if row is not None:
+            existing[key] = (row[0], json.loads(row[1]))
+    return existing
+
+
+def bulk_upsert_deals(
+    conn: sqlite3.Connection,
+    deals: Iterable[Deal],
+    chunk_size: int = 1000,
+    touch_unchanged: bool = True,
+    revive_before: str = "",
+    seen_at: Optional[str] = None,
+    reclassify: bool = False,
+    outcomes: Optional[Dict[tuple, str]] = None,
+) -> UpsertStats:
+    stats = UpsertStats()
+    for batch in chunked(deals, chunk_size):
+        stamp = seen_at or utc_now_iso()
+        keyed = [((deal.app_name, deal.promo_type, deal.website_url), deal) for deal in batch]
+        existing = _existing_rows(conn, {key for key, _ in keyed})
+        writes: List[tuple] = []
+        touches: List[tuple] = []
+        for key, deal in keyed:
+            outcome = "inserted"
+            if key in existing:
+                # A scan sees only some of a deal's sources before it is written; the ones
+                # stored by earlier scans stay.
+                stored_hash, stored_urls = existing[key]
+                urls = stored_urls + [url for url in deal.source_urls if url not in stored_urls]
+                if urls != deal.source_urls:
+                    deal = replace(deal, source_urls=urls)
+                outcome = "updated"
+                content_hash = deal_content_hash(deal)
+                if stored_hash == content_hash:
+                    outcome = "unchanged"
+            else:
+                content_hash = deal_content_hash(deal)
+            if outcomes is not None:
+                outcomes[key] = outcome
+            if outcome == "unchanged":
+                stats.unchanged += 1
+                touches.append((stamp, revive_before, stamp, *key))
+                continue
+            if outcome == "inserted":
+                stats.inserted += 1
+            else:
+                stats.updated += 1
+            existing[key] = (content_hash, deal.source_urls)
+            writes.append(_deal_row(deal, content_hash, stamp))
+        with conn:
+            conn.executemany(RECLASSIFY_SQL if reclassify else UPSERT_SQL, writes)
+            if touch_unchanged:
+                conn.executemany(TOUCH_SQL, touches)
+    return stats
+
+
+def find_deals(
+    conn: sqlite3.Connection, app_name: str, website_url: str
+) -> List[Tuple[str, str, Optional[str]]]:
+    return conn.execute(
+        """
+        select promo_type, verification_status, verification_notes from deals
+        where app_name = ? and website_url = ? and removed_at is null
+        """,
+        (app_name, website_url),
+    ).fetchall()
+
+
+def remove_deals(conn: sqlite3.Connection, keys: Iterable[tuple], removed_at: str) -> int:
+    # Kept as tombstones so delta exports can report the removal.
+    with conn:
+        cursor = conn.executemany(
+            """
+            update deals set removed_at = ?, last_changed = ?
+            where app_name = ? and promo_type = ? and website_url = ? and removed_at is null
+            """,
+            [(removed_at, removed_at, *key) for key in keys],
         )
-        rows += 1
-    conn.commit()
-    return rows
+    return cursor.rowcount
+
+
+def upsert_deals(conn: sqlite3.Connection, deals: Iterable[Deal]) -> int:
+    return bulk_upsert_deals(conn, deals).total
+
+
+def store_deals(
+    conn: sqlite3.Connection,
+    deals: Iterable[Deal],
+    batch_size: int = 50,
+    revive_before: str = "",
+) -> UpsertStats:
+    stats = UpsertStats()
+    outcomes: Dict[tuple, str] = {}
+    written: Dict[tuple, Tuple[Deal, int]] = {}
+    for batch in chunked(deals, batch_size):
+        stats += bulk_upsert_deals(conn, batch, revive_before=revive_before, outcomes=outcomes)
+        for deal in batch:
+            written[(deal.app_name, deal.promo_type, deal.website_url)] = (
+                deal,
+                len(deal.source_urls),
+            )
+    # A streaming scan adds later sightings' source URLs to deals it already handed over;
+    # write those once more, counting each deal by its net change over the whole scan.
+    grown = [deal for deal, count in written.values() if len(deal.source_urls) > count]
+    if grown:
+        first = dict(outcomes)
+        bulk_upsert_deals(conn, grown, revive_before=revive_before, outcomes=outcomes)
+        for deal in grown:
+            key = (deal.app_name, deal.promo_type, deal.website_url)
+            if first[key] == "unchanged" and outcomes[key] == "updated":
+                stats.unchanged -= 1
+                stats.updated += 1
+    return stats
+
+
+DEAL_COLUMNS = """
+app_name, website_url, promo_type, trial_length, requirements,
+promo_code, source_urls, date_found, category, notes,
+verification_status, verification_notes
+"""
+
+
+def _row_to_record(row: tuple) -> dict:
+    return {
+        "app_name": row[0],
+        "website_url": row[1],
+        "promo_type": row[2],
+        "trial_length": row[3],
+        "requirements": row[4],
+        "promo_code": row[5],
+        "source_urls": json.loads(row[6]),
+        "date_found": row[7],
+        "category": row[8],
+        "notes": row[9],
+        "verification_status": row[10],
+        "verification_notes": row[11],
+    }
+
+
+def iter_deals(
+    conn: sqlite3.Connection,
+    category: Optional[str] = None,
+    promo_type: Optional[str] = None,
+    verification_status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    page_size: int = 500,
+) -> Iterator[dict]:
+    filters: List[str] = ["removed_at is null"]
+    params: List[Any] = []
+    for column, value in (
+        ("category", category),
+        ("promo_type", promo_type),
+        ("verification_status", verification_status),
+    ):
+        if value is not None:
+            filters.append(f"{column} = ?")
+            params.append(value)
+    if since is not None:
+        filters.append("date_found >= ?")
+        params.append(since)
+    if until is not None:
+        filters.append("date_found < ?")
+        params.append(until)
+
+    cursor: Optional[Tuple[str, int]] = None
+    while True:
+        clauses = list(filters)
+        page_params = list(params)
+        if cursor is not None:
+            clauses.append("(date_found, id) < (?, ?)")
+            page_params.extend(cursor)
+        where = f"where {' and '.join(clauses)}"
+        rows = conn.execute(
+            f"""
+            select {DEAL_COLUMNS}, id
+            from deals
+            {where}
+            order by date_found desc, id desc
+            limit ?
+            """,
+            (*page_params, page_size),
+        ).fetchall()
+        for row in rows:
+            yield _row_to_record(row)
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1][7], rows[-1][12])
 
 
 def fetch_deals(conn: sqlite3.Connection) -> List[dict]:
+    return list(iter_deals(conn))
+
+
+def iter_deal_changes(
+    conn: sqlite3.Connection,
+    since: str,
+    until: str,
+    expire_before: Optional[str] = None,
+    expired_since: Optional[str] = None,
+) -> Iterator[dict]:
+    cursor = conn.execute(
+        f"""
+        select {DEAL_COLUMNS}, first_seen, last_changed
+        from deals
+        where last_changed > ? and last_changed <= ? and removed_at is null
+        order by last_changed, id
+        """,
+        (since, until),
+    )
+    for row in cursor:
+        record = _row_to_record(row)
+        record["change"] = "added" if row[12] > since else "changed"
+        record["last_changed"] = row[13]
+        yield record
+
+    cursor = conn.execute(
+        """
+        select app_name, website_url, promo_type, removed_at
+        from deals
+        where removed_at > ? and removed_at <= ?
+        order by removed_at, id
+        """,
+        (since, until),
+    )
+    for app_name, website_url, promo_type, removed_at in cursor:
+        yield {
+            "app_name": app_name,
+            "website_url": website_url,
+            "promo_type": promo_type,
+            "change": "removed",
+            "last_changed": removed_at,
+        }
+
+    if expire_before is None:
+        return
     cursor = conn.execute(
         """
-        select app_name, website_url, promo_type, trial_length, requirements,
-               promo_code, source_urls, date_found, category, notes,
-               verification_status, verification_notes
+        select app_name, website_url, promo_type, last_seen
         from deals
-        order by date_found desc
+        where last_seen > ? and last_seen <= ? and removed_at is null
+        order by last_seen, id
+        """,
+        (expired_since or "", expire_before),
+    )
+    for app_name, website_url, promo_type, last_seen in cursor:
+        yield {
+            "app_name": app_name,
+            "website_url": website_url,
+            "promo_type": promo_type,
+            "change": "expired",
+            "last_changed": last_seen,
+        }
+
+
+def get_watermark(conn: sqlite3.Connection, target: str) -> Optional[str]:
+    row = conn.execute(
+        "select watermark from export_watermarks where target = ?", (target,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def set_watermark(conn: sqlite3.Connection, target: str, watermark: str, updated_at: str) -> None:
+    with conn:
+        conn.execute(
+            """
+            insert into export_watermarks (target, watermark, updated_at) values (?, ?, ?)
+            on conflict(target) do update set
+                watermark=excluded.watermark,
+                updated_at=excluded.updated_at
+            """,
+            (target, watermark, updated_at),
+        )
+
+
+def get_verification(
+    conn: sqlite3.Connection, url: str
+) -> Optional[Tuple[str, Optional[str], Optional[str], str]]:
+    return conn.execute(
+        "select status, notes, content_hash, verified_at from verifications where url = ?",
+        (url,),
+    ).fetchone()
+
+
+def save_verification(
+    conn: sqlite3.Connection,
+    url: str,
+    status: str,
+    notes: Optional[str],
+    content_hash: Optional[str],
+    verified_at: str,
+) -> None:
+    conn.execute(
         """
+        insert into verifications (url, status, notes, content_hash, verified_at)
+        values (?, ?, ?, ?, ?)
+        on conflict(url) do update set
+            status=excluded.status,
+            notes=excluded.notes,
+            content_hash=excluded.content_hash,
+            verified_at=excluded.verified_at
+        """,
+        (url, status, notes, content_hash, verified_at),
     )
-    rows = []
-    for row in cursor.fetchall():
-        rows.append(
-            {
-                "app_name": row[0],
-                "website_url": row[1],
-                "promo_type": row[2],
-                "trial_length": row[3],
-                "requirements": row[4],
-                "promo_code": row[5],
-                "source_urls": json.loads(row[6]),
-                "date_found": row[7],
-                "category": row[8],
-                "notes": row[9],
-                "verification_status": row[10],
-                "verification_notes": row[11],
-            }
+    conn.commit()
+
+
+def get_cursor(conn: sqlite3.Connection, source: str, query: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        "select cursor from source_cursors where source = ? and query = ?", (source, query)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def save_cursors(
+    conn: sqlite3.Connection, cursors: Dict[Tuple[str, str], Dict[str, Any]], updated_at: str
+) -> None:
+    with conn:
+        conn.executemany(
+            """
+            insert into source_cursors (source, query, cursor, updated_at) values (?, ?, ?, ?)
+            on conflict(source, query) do update set
+                cursor=excluded.cursor,
+                updated_at=excluded.updated_at
+            """,
+            [
+                (source, query, json.dumps(cursor, sort_keys=True), updated_at)
+                for (source, query), cursor in cursors.items()
+            ],
         )
-    return rows
@@ -2,11 +2,12 @@ from __future__ import annotations
 
 import json
 import logging
+import os
 import random
-import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import asdict, is_dataclass
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable, Iterator, List, Sequence
 
 DEFAULT_USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
@@ -18,21 +19,6 @@ DEFAULT_USER_AGENTS = [
 ]
 
 
-class RateLimiter:
-    def __init__(self, min_delay: float, max_delay: float):
-        self.min_delay = min_delay
-        self.max_delay = max_delay
-        self._last = 0.0
-
-    def wait(self) -> None:
-        now = time.time()
-        elapsed = now - self._last
-        delay = random.uniform(self.min_delay, self.max_delay)
-        if elapsed < delay:
-            time.sleep(delay - elapsed)
-        self._last = time.time()
-
-
 def pick_user_agent() -> str:
     return random.choice(DEFAULT_USER_AGENTS)
 
@@ -68,3 +54,35 @@ def unique_by(items: Iterable[Any], key_fn) -> list[Any]:
         if key not in seen:
             seen[key] = item
     return list(seen.values())
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def usable_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def map_chunks(
+    fn: Callable[[Sequence[Any]], Any], items: Sequence[Any], chunk_size: int, workers: int
+) -> List[Any]:
+    chunks = [items[start : start + chunk_size] for start in range(0, len(items), chunk_size)]
+    if workers < 2 or len(chunks) < 2:
+        return [fn(chunk) for chunk in chunks]
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            # map() yields in submission order, so results line up with the input.
+            return list(executor.map(fn, chunks))
+    except (OSError, RuntimeError) as exc:
+        logging.warning("Process pool unavailable, running serially: %s", exc)
+        return [fn(chunk) for chunk in chunks]
@@ -1,28 +1,419 @@
 from __future__ import annotations
 
+import codecs
+import hashlib
 import logging
-from typing import List, Optional, Tuple
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
 
 import requests
+import urllib3
+from urllib3.exceptions import ReadTimeoutError
 
-from .utils import RateLimiter, pick_user_agent
+from .canonical import canonicalize_url
+from .httpclient import HttpClient
+from .models import utc_now_iso
+from .storage import get_verification, save_verification
 
 
-def verify_url(
-    url: str, keywords: List[str], limiter: RateLimiter
+@dataclass
+class VerificationResult:
+    status: str
+    notes: Optional[str]
+    content_hash: Optional[str] = None
+    bytes_read: int = 0
+    match_offset: Optional[int] = None
+
+
+PENDING = ("Pending", "Verification deadline exceeded")
+MAX_BODY_BYTES = 1024 * 1024
+CHUNK_SIZE = 16 * 1024
+# No Content-Type at all is read too; anything else (images, PDFs, JSON, bundles) is not a page.
+PAGE_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+PROBE_PATHS = [
+    "/pricing",
+    "/plans",
+    "/upgrade",
+    "/billing",
+    "/student",
+    "/education",
+    "/promo",
+    "/offers",
+    "/",
+]
+# Where discovered items usually point; their pricing pages say nothing about the product.
+PROBE_SKIP_HOSTS = [
+    "reddit.com",
+    "news.ycombinator.com",
+    "github.com",
+    "producthunt.com",
+    "duckduckgo.com",
+]
+
+# The verify_many() batch the current worker thread is checking a URL for.
+_worker = threading.local()
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.abandoned = False
+
+
+@contextmanager
+def _unless_abandoned() -> Iterator[bool]:
+    # Held while a result is written, so verify_many() cannot give up on the batch (and
+    # hand the connection back to its caller) in the middle of a write.
+    batch = getattr(_worker, "batch", None)
+    if batch is None:
+        yield True
+        return
+    with batch.lock:
+        yield not batch.abandoned
+
+
+def _run_check(
+    check: Callable[[str], Tuple[str, Optional[str]]], url: str, batch: _Batch
 ) -> Tuple[str, Optional[str]]:
-    limiter.wait()
-    headers = {"User-Agent": pick_user_agent()}
+    _worker.batch = batch
     try:
-        resp = requests.get(url, headers=headers, timeout=20)
+        return check(url)
+    finally:
+        _worker.batch = None
+
+
+def _iter_body(resp: requests.Response, timeout: float) -> Iterator[bytes]:
+    raw = resp.raw
+    # Recorded and replayed responses are already in memory.
+    if not isinstance(raw, urllib3.BaseHTTPResponse) or resp._content_consumed:
+        yield from resp.iter_content(CHUNK_SIZE)
+        return
+    # The read timeout only bounds each socket read, so a page trickling in a few bytes at
+    # a time could hold a worker indefinitely; read1() returns whatever has arrived, which
+    # lets the whole body be held to `timeout` as well.
+    end = time.monotonic() + timeout
+    while True:
+        if time.monotonic() >= end:
+            raise requests.ReadTimeout(f"Body not read within {timeout:g}s")
+        try:
+            chunk = raw.read1(CHUNK_SIZE, decode_content=True)
+        except ReadTimeoutError as exc:
+            raise requests.ReadTimeout(exc) from exc
+        except (urllib3.exceptions.HTTPError, OSError) as exc:
+            raise requests.ConnectionError(exc) from exc
+        if not chunk:
+            return
+        yield chunk
+
+
+def _find_keyword(
+    resp: requests.Response, keywords: List[str], max_bytes: int, timeout: float
+) -> Tuple[Optional[int], int, str]:
+    try:
+        decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    digest = hashlib.sha256()
+    longest = max((len(keyword) for keyword in keywords), default=0)
+    bytes_read = 0
+    seen = 0  # characters decoded before `tail`
+    tail = ""
+    for chunk in _iter_body(resp, timeout):
+        chunk = chunk[: max_bytes - bytes_read]
+        bytes_read += len(chunk)
+        digest.update(chunk)
+        # Keep the end of the previous chunk so a keyword split across chunks still matches.
+        window = tail + decoder.decode(chunk).lower()
+        offsets = [window.find(keyword) for keyword in keywords]
+        found = [offset for offset in offsets if offset >= 0]
+        if found:
+            return seen + min(found), bytes_read, digest.hexdigest()
+        keep = min(len(window), max(longest - 1, 0))
+        seen += len(window) - keep
+        tail = window[len(window) - keep :]
+        if bytes_read >= max_bytes:
+            break
+    return None, bytes_read, digest.hexdigest()
+
+
+def check_url(
+    url: str,
+    keywords: List[str],
+    client: HttpClient,
+    timeout: Optional[float] = None,
+    max_bytes: int = MAX_BODY_BYTES,
+) -> VerificationResult:
+    try:
+        resp = client.get(
+            url, timeout=(client.timeout[0], timeout) if timeout else None, stream=True
+        )
     except requests.RequestException as exc:
-        return "Unverified", f"Request failed: {exc}"
+        return VerificationResult("Unverified", f"Request failed: {exc}")
+
+    # Stop reading at the first keyword: the rest of the body is never downloaded.
+    with resp:
+        if resp.status_code != 200:
+            return VerificationResult("Unverified", f"HTTP {resp.status_code}")
+        content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type and content_type not in PAGE_CONTENT_TYPES:
+            return VerificationResult("Unverified", f"Not a web page ({content_type})")
+        try:
+            offset, bytes_read, content_hash = _find_keyword(
+                resp, keywords, max_bytes, timeout or client.timeout[1]
+            )
+        except requests.RequestException as exc:
+            return VerificationResult("Unverified", f"Request failed: {exc}")
+
+    if offset is not None:
+        logging.debug("Verified %s at character %s after %s bytes", url, offset, bytes_read)
+        return VerificationResult("Verified", None, content_hash, bytes_read, offset)
+    logging.debug("Verification keywords missing for %s in %s bytes", url, bytes_read)
+    return VerificationResult(
+        "Unverified", "Verification keywords missing", content_hash, bytes_read
+    )
+
 
-    if resp.status_code != 200:
-        return "Unverified", f"HTTP {resp.status_code}"
+class OriginProber:
+    def __init__(
+        self,
+        client: HttpClient,
+        keywords: List[str],
+        paths: Sequence[str] = PROBE_PATHS,
+        workers: int = 2,
+        timeout: Optional[float] = None,
+        max_bytes: int = MAX_BODY_BYTES,
+        skip_hosts: Iterable[str] = PROBE_SKIP_HOSTS,
+    ):
+        self.client = client
+        self.keywords = keywords
+        self.paths = list(paths)
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.skip_hosts = {host.lower() for host in skip_hosts}
+        self._probes: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls, client: HttpClient, keywords: List[str], settings: dict, max_bytes: int
+    ) -> "OriginProber":
+        return cls(
+            client,
+            keywords,
+            paths=settings.get("probe_paths", PROBE_PATHS),
+            workers=settings.get("per_host", 2),
+            timeout=settings.get("request_timeout"),
+            max_bytes=max_bytes,
+            skip_hosts=settings.get("probe_skip_hosts", PROBE_SKIP_HOSTS),
+        )
+
+    def _skipped(self, host: str) -> bool:
+        return any(host == skip or host.endswith("." + skip) for skip in self.skip_hosts)
+
+    def confirm(self, url: str) -> Optional[VerificationResult]:
+        parts = urlparse(url)
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in ("http", "https") or not host or self._skipped(host):
+            return None
+        origin = f"{parts.scheme}://{parts.netloc.lower()}"
+        # One probe per origin per run: later items for the origin, including ones that
+        # arrive while it is still running, share its result.
+        with self._lock:
+            probe = self._probes.get(origin)
+            owner = probe is None
+            if owner:
+                probe = self._probes[origin] = Future()
+        if owner:
+            try:
+                probe.set_result(self._probe(origin))
+            except BaseException as exc:
+                probe.set_exception(exc)
+                raise
+        return probe.result()
+
+    def _probe(self, origin: str) -> Optional[VerificationResult]:
+        urls = [origin + path for path in self.paths]
+        if not urls:
+            return None
+        # Every request still goes through the client's per-host rate limiter; this only
+        # bounds how many of them wait on it at once.
+        executor = ThreadPoolExecutor(max_workers=min(self.workers, len(urls)))
+        try:
+            futures = {
+                executor.submit(
+                    check_url, url, self.keywords, self.client, self.timeout, self.max_bytes
+                ): url
+                for url in urls
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                if result.status == "Verified":
+                    logging.debug("Confirmed %s on %s", origin, futures[future])
+                    return replace(result, notes=f"Confirmed on {futures[future]}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return None
+
+
+def verify_url(
+    url: str,
+    keywords: List[str],
+    client: HttpClient,
+    timeout: Optional[float] = None,
+    max_bytes: int = MAX_BODY_BYTES,
+    prober: Optional[OriginProber] = None,
+) -> Tuple[str, Optional[str]]:
+    result = check_url(url, keywords, client, timeout, max_bytes)
+    if result.status != "Verified" and prober:
+        result = prober.confirm(url) or result
+    return result.status, result.notes
+
+
+class VerificationCache:
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        verified_ttl: timedelta = timedelta(hours=24),
+        unverified_ttl: timedelta = timedelta(hours=6),
+        refresh: bool = False,
+    ):
+        self.conn = conn
+        self.verified_ttl = verified_ttl
+        self.unverified_ttl = unverified_ttl
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls, conn: sqlite3.Connection, settings: dict, refresh: bool = False
+    ) -> "VerificationCache":
+        return cls(
+            conn,
+            verified_ttl=timedelta(hours=settings.get("verified_ttl_hours", 24)),
+            unverified_ttl=timedelta(hours=settings.get("unverified_ttl_hours", 6)),
+            refresh=refresh,
+        )
+
+    def _ttl(self, status: str) -> timedelta:
+        return self.verified_ttl if status == "Verified" else self.unverified_ttl
+
+    def lookup(self, url: str) -> Optional[VerificationResult]:
+        with self._lock:
+            row = get_verification(self.conn, canonicalize_url(url))
+        if row is None:
+            return None
+        status, notes, content_hash, verified_at = row
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(verified_at)
+        if age > self._ttl(status):
+            return None
+        return VerificationResult(status, notes, content_hash)
+
+    def verify(
+        self,
+        url: str,
+        keywords: List[str],
+        client: HttpClient,
+        timeout: Optional[float] = None,
+        max_bytes: int = MAX_BODY_BYTES,
+        prober: Optional[OriginProber] = None,
+    ) -> Tuple[str, Optional[str]]:
+        cached = None if self.refresh else self.lookup(url)
+        with self._lock:
+            if cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached:
+            return cached.status, cached.notes
+
+        result = check_url(url, keywords, client, timeout, max_bytes)
+        if result.status != "Verified" and prober:
+            result = prober.confirm(url) or result
+        if result.notes and result.notes.startswith("Request failed"):
+            return result.status, result.notes
+        with _unless_abandoned() as wanted, self._lock:
+            # A check that outlived its deadline was already reported Pending.
+            if not wanted:
+                return result.status, result.notes
+            save_verification(
+                self.conn,
+                canonicalize_url(url),
+                result.status,
+                result.notes,
+                result.content_hash,
+                utc_now_iso(),
+            )
+        return result.status, result.notes
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def verify_many(
+    urls: Sequence[str],
+    check: Callable[[str], Tuple[str, Optional[str]]],
+    workers: int = 8,
+    per_host: int = 2,
+    deadline: Optional[float] = None,
+) -> List[Tuple[str, Optional[str]]]:
+    results: List[Tuple[str, Optional[str]]] = [PENDING] * len(urls)
+    if not urls:
+        return results
+    if deadline is not None and deadline <= 0:
+        logging.warning("Verification deadline reached; %s URLs left Pending", len(urls))
+        return results
+    workers = max(workers, 1)
+    per_host = max(per_host, 1)
+    pending = deque(enumerate(urls))
+    active: Counter = Counter()
+    running: Dict[Future, Tuple[int, str]] = {}
+    end = None if deadline is None else time.monotonic() + deadline
+    batch = _Batch()
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def dispatch() -> None:
+        blocked = deque()
+        while pending and len(running) < workers:
+            index, url = pending.popleft()
+            host = urlparse(url).netloc.lower()
+            if active[host] >= per_host:
+                blocked.append((index, url))
+                continue
+            active[host] += 1
+            running[executor.submit(_run_check, check, url, batch)] = (index, host)
+        pending.extendleft(reversed(blocked))
+
+    try:
+        dispatch()
+        while running:
+            timeout = None if end is None else end - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                break
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, host = running.pop(future)
+                active[host] -= 1
+                results[index] = future.result()
+            dispatch()
+    finally:
+        with batch.lock:
+            batch.abandoned = True
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    content = resp.text.lower()
-    if any(keyword in content for keyword in keywords):
-        return "Verified", None
-    logging.debug("Verification keywords missing for %s", url)
-    return "Unverified", "Verification keywords missing"
+    unfinished = len(running) + len(pending)
+    if unfinished:
+        logging.warning("Verification deadline reached; %s URLs left Pending", unfinished)
+    return results
@@ -0,0 +1,205 @@
+"""Filter engine throughput on a synthetic corpus of candidate titles and snippets.
+
+Times the phrase matcher's single ``scan`` of a text, ``apply_filters``, ``extract_promo_code``
+and the classifiers that read the scan's hits (``detect_promo_type``, ``scan.infer_category``,
+``scan.infer_requirements``), ``classify`` (everything one candidate goes through, as the
+pipeline runs it) and ``apply_filters_batch`` over the whole corpus. The corpus mixes accept
+and reject reasons in controlled proportions (``--mix``). With ``--baseline`` the run fails
+(exit 1) when any function's throughput drops by more than ``--max-regression``.
+
+    python benchmarks/bench_filters.py --sizes 10000 100000 1000000
+    python benchmarks/bench_filters.py --save-baseline baseline_filters.json
+    python benchmarks/bench_filters.py --baseline baseline_filters.json --max-regression 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from aisubscalp.filters import (  # noqa: E402
+    apply_filters,
+    apply_filters_batch,
+    detect_promo_type,
+    extract_promo_code,
+)
+from aisubscalp.scan import build_matcher, infer_category, infer_requirements  # noqa: E402
+
+NAMES = ["Nimbus", "Quill", "Orbit", "Vertex", "Lumen", "Pixel", "Echo", "Nova", "Flux", "Cobalt"]
+AI_TERMS = ["AI", "LLM-powered", "generative", "machine learning", "ChatGPT-based"]
+PRODUCTS = [
+    "code reviewer",
+    "blog writer",
+    "photo editor",
+    "video studio",
+    "voice cloner",
+    "notes workspace",
+    "sales copilot",
+    "spreadsheet helper",
+]
+NON_AI_PRODUCTS = ["budget tracker", "recipe box", "habit log", "cloud storage", "todo list"]
+OFFERS = [
+    "free trial for {n} days",
+    "try free for {n} weeks",
+    "100% off with code {code}",
+    "limited time free",
+    "free credits on signup",
+    "free plan forever",
+    "free tier, no credit card",
+    "open source and self-hosted",
+]
+FILLERS = [
+    "Launching today on Product Hunt.",
+    "Built by a two-person team in Berlin.",
+    "Works with Slack, Notion and Google Docs.",
+    "Sign up in seconds.",
+    "",
+]
+
+DEFAULT_MIX = {
+    "accept": 0.55,
+    "not_ai": 0.15,
+    "student": 0.05,
+    "referral": 0.05,
+    "discount": 0.08,
+    "no_free": 0.07,
+    "first_time": 0.05,
+}
+
+
+def _offer(rng: random.Random) -> str:
+    code = "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ23456789") for _ in range(10))
+    return rng.choice(OFFERS).format(n=rng.choice([7, 14, 30]), code=code)
+
+
+def make_text(reason: str, rng: random.Random) -> str:
+    name = rng.choice(NAMES)
+    product = f"{rng.choice(AI_TERMS)} {rng.choice(PRODUCTS)}"
+    filler = rng.choice(FILLERS)
+    if reason == "not_ai":
+        return f"{name} {rng.choice(NON_AI_PRODUCTS)} - {_offer(rng)}. {filler}"
+    if reason == "student":
+        return f"{name}: {product}, {_offer(rng)} for students. {filler}"
+    if reason == "referral":
+        return f"{name}: {product} - {_offer(rng)} when you invite friends. {filler}"
+    if reason == "discount":
+        return f"{name}: {product} now {rng.choice([20, 40, 50, 70])}% off. {filler}"
+    if reason == "no_free":
+        return f"{name}: {product} for teams, plans from $12/month. {filler}"
+    if reason == "first_time":
+        return f"{name}: {product} - free credits for new customers. {filler}"
+    return f"{name}: {product} - {_offer(rng)}. {filler}"
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        reason, _, weight = part.partition("=")
+        if reason not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown reason {reason!r}")
+        mix[reason] = float(weight)
+    return mix
+
+
+def generate_corpus(size: int, mix: Dict[str, float], seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    reasons = rng.choices(list(mix), weights=list(mix.values()), k=size)
+    return [make_text(reason, rng) for reason in reasons]
+
+
+def _best_of(fn: Callable[..., object], inputs: List[Tuple[Any, ...]], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for args in inputs:
+            fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(size: int, mix: Dict[str, float], seed: int, repeats: int) -> dict:
+    texts = generate_corpus(size, mix, seed)
+    keywords = json.loads((ROOT / "config" / "keywords.json").read_text())
+    matcher = build_matcher(keywords)
+    scanned = [(text, matcher.scan(text.lower())) for text in texts]
+
+    def classify(text: str) -> None:
+        result = apply_filters(text, matcher)
+        if result.allowed:
+            infer_category(text, keywords, result.hits)
+            infer_requirements(text, result.hits)
+
+    cases = {
+        "scan": (matcher.scan, [(text.lower(),) for text in texts]),
+        "apply_filters": (apply_filters, [(text, matcher) for text in texts]),
+        "detect_promo_type": (detect_promo_type, [(text.lower(), hits) for text, hits in scanned]),
+        "extract_promo_code": (extract_promo_code, [(text,) for text in texts]),
+        "infer_category": (infer_category, [(text, keywords, hits) for text, hits in scanned]),
+        "infer_requirements": (infer_requirements, scanned),
+        "classify": (classify, [(text,) for text in texts]),
+        "apply_filters_batch": (apply_filters_batch, [(texts,)]),
+    }
+    functions = {}
+    for name, (fn, inputs) in cases.items():
+        seconds = _best_of(fn, inputs, repeats)
+        functions[name] = {
+            "seconds": round(seconds, 4),
+            "texts_per_sec": round(size / seconds),
+        }
+    reasons = Counter(apply_filters(text).reason for text in texts)
+    return {"size": size, "functions": functions, "reasons": dict(reasons.most_common())}
+
+
+def regressions(results: List[dict], baseline: List[dict], threshold: float) -> List[str]:
+    previous = {entry["size"]: entry["functions"] for entry in baseline}
+    failures = []
+    for entry in results:
+        for name, numbers in entry["functions"].items():
+            old = previous.get(entry["size"], {}).get(name)
+            if not old:
+                continue
+            change = numbers["texts_per_sec"] / old["texts_per_sec"] - 1
+            if change < -threshold:
+                failures.append(f"{name} @ {entry['size']}: {change:+.1%} texts/sec")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help="Reason weights, e.g. accept=0.5,not_ai=0.3,discount=0.2",
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeats", type=int, default=3, help="Best-of-N timing")
+    parser.add_argument("--baseline", type=Path, help="Compare against this result file")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    parser.add_argument("--save-baseline", type=Path, help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = [bench(size, args.mix, args.seed, args.repeats) for size in args.sizes]
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=2) + "\n")
+    print(json.dumps(results, indent=2))
+    if args.baseline:
+        failures = regressions(results, json.loads(args.baseline.read_text()), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""End-to-end scan throughput against a local fake web (no network access).
+
+Runs the real ``scan`` pipeline (discovery, filtering, verification, SQLite) with every
+request answered by ``benchmarks/fakeweb.py``, then reports items/sec, deals/sec,
+p50/p95 per stage and peak RSS. Compare against a stored baseline with ``--baseline``.
+
+    python benchmarks/bench_scan.py --latency-ms 20 --error-rate 0.02
+    python benchmarks/bench_scan.py --save-baseline benchmarks/baseline_scan.json
+    python benchmarks/bench_scan.py --baseline benchmarks/baseline_scan.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fakeweb import FakeWeb, LocalRouteAdapter  # noqa: E402
+
+from aisubscalp import cli, discovery, scan, storage, verify  # noqa: E402
+from aisubscalp.daemon import ScanRuntime  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+DISCOVERY_FUNCTIONS = [
+    "search_duckduckgo",
+    "search_reddit",
+    "search_hackernews",
+    "search_hackernews_merged",
+    "search_producthunt_rss",
+    "scrape_directory",
+    "search_github",
+]
+COMPARED = ["items_per_sec", "deals_per_sec", "wall_seconds"]
+
+
+class StageTimer:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, stage: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.samples[stage].append(time.perf_counter() - start)
+
+        timed.__name__ = fn.__name__
+        return timed
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for stage, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+            result[stage] = {
+                "count": len(ordered),
+                "p50_ms": round(statistics.median(ordered) * 1000, 2),
+                "p95_ms": round(p95 * 1000, 2),
+                "total_s": round(sum(ordered), 3),
+            }
+        return result
+
+
+def instrument(timer: StageTimer) -> None:
+    for name in DISCOVERY_FUNCTIONS:
+        setattr(discovery, name, timer.wrap("discover", getattr(discovery, name)))
+    scan.classify = timer.wrap("filter", scan.classify)
+    verify.check_url = timer.wrap("verify", verify.check_url)
+    storage.bulk_upsert_deals = timer.wrap("store", storage.bulk_upsert_deals)
+
+
+def write_config(config_dir: Path) -> None:
+    shutil.copytree(ROOT / "config", config_dir)
+    path = config_dir / "sources.json"
+    sources = json.loads(path.read_text())
+    # The stand-in is local: lift every rate limit so the numbers measure our own code.
+    sources["rate_limits"] = {"default": {"rate": 10_000.0, "burst": 100, "jitter": 0.0}}
+    path.write_text(json.dumps(sources, indent=2))
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run(args: argparse.Namespace) -> dict:
+    timer = StageTimer()
+    instrument(timer)
+    os.environ.setdefault("GITHUB_TOKEN", "benchmark")
+    with (
+        tempfile.TemporaryDirectory() as tmp,
+        FakeWeb(
+            apps=args.apps,
+            per_page=args.per_page,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        ) as web,
+    ):
+        workdir = Path(tmp)
+        write_config(workdir / "config")
+        scan_args = argparse.Namespace(
+            config_dir=str(workdir / "config"),
+            db_path=str(workdir / "bench.db"),
+            workers=args.workers,
+            full_rescan=True,
+        )
+        with ScanRuntime(workdir / "config", workdir / "bench.db") as runtime:
+            client = runtime.client
+            client.adapter = LocalRouteAdapter(web.port, pool_maxsize=64, max_retries=0)
+            client.session.mount("https://", client.adapter)
+            client.session.mount("http://", client.adapter)
+            start = time.perf_counter()
+            counts = cli.run_scan(scan_args, runtime)
+            wall = time.perf_counter() - start
+            http = client.stats()
+
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in ("apps", "per_page", "latency_ms", "jitter_ms", "error_rate", "seed")
+        },
+        "wall_seconds": round(wall, 3),
+        "items": counts["items"],
+        "deals": counts["deals"],
+        "items_per_sec": round(counts["items"] / wall, 1),
+        "deals_per_sec": round(counts["deals"] / wall, 1),
+        "stages": timer.summary(),
+        "http": {**http, "served": web.requests, "injected_errors": web.errors},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(result: dict, baseline: dict) -> Dict[str, str]:
+    deltas = {}
+    for key in COMPARED:
+        if baseline.get(key):
+            deltas[key] = f"{(result[key] - baseline[key]) / baseline[key] * 100:+.1f}%"
+    for stage, numbers in result["stages"].items():
+        previous = baseline.get("stages", {}).get(stage, {}).get("p95_ms")
+        if previous:
+            deltas[f"{stage}.p95_ms"] = f"{(numbers['p95_ms'] - previous) / previous * 100:+.1f}%"
+    return deltas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", type=int, default=2000, help="Distinct fake products")
+    parser.add_argument("--per-page", type=int, default=25, help="Results per source page")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 429/5xx replies")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, help="Discovery workers (default: config)")
+    parser.add_argument("--baseline", type=Path, help="Compare against this result file")
+    parser.add_argument("--save-baseline", type=Path, help="Write the result to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.baseline:
+        result["vs_baseline"] = compare(result, json.loads(args.baseline.read_text()))
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(result, indent=2) + "\n")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
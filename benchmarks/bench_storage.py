@@ -0,0 +1,133 @@
+"""Deal upsert throughput: bulk WAL path vs the old row-at-a-time loop.
+
+Both paths commit every ``--batch`` deals, like the streaming scan sink does.
+
+    python benchmarks/bench_storage.py --rows 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from aisubscalp.models import Deal  # noqa: E402
+from aisubscalp.storage import SCHEMA, init_db, store_deals  # noqa: E402
+from aisubscalp.utils import chunked  # noqa: E402
+
+
+def make_deals(count: int) -> List[Deal]:
+    return [
+        Deal(
+            app_name=f"Synthetic AI App {index}",
+            website_url=f"https://app{index}.example",
+            promo_type="Free Trial" if index % 3 else "Open-Source",
+            trial_length="14 day" if index % 3 else None,
+            requirements="Signup required" if index % 5 == 0 else None,
+            promo_code=None,
+            source_urls=[f"https://app{index}.example/pricing"],
+            date_found="2026-01-01T00:00:00+00:00",
+            category="coding",
+            notes=f"duckduckgo: Synthetic AI App {index}",
+            verification_status="Verified",
+            verification_notes=None,
+        )
+        for index in range(count)
+    ]
+
+
+LEGACY_UPSERT_SQL = """
+insert into deals (
+    app_name, website_url, promo_type, trial_length, requirements,
+    promo_code, source_urls, date_found, category, notes,
+    verification_status, verification_notes
+) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+on conflict(app_name, promo_type, website_url) do update set
+    trial_length=excluded.trial_length,
+    requirements=excluded.requirements,
+    promo_code=excluded.promo_code,
+    source_urls=excluded.source_urls,
+    date_found=excluded.date_found,
+    category=excluded.category,
+    notes=excluded.notes,
+    verification_status=excluded.verification_status,
+    verification_notes=excluded.verification_notes
+"""
+
+
+def legacy_row(deal: Deal) -> tuple:
+    return (
+        deal.app_name,
+        deal.website_url,
+        deal.promo_type,
+        deal.trial_length,
+        deal.requirements,
+        deal.promo_code,
+        json.dumps(deal.source_urls, ensure_ascii=True),
+        deal.date_found,
+        deal.category,
+        deal.notes,
+        deal.verification_status,
+        deal.verification_notes,
+    )
+
+
+def legacy_upsert(conn: sqlite3.Connection, deals: List[Deal], batch: int) -> None:
+    for chunk in chunked(deals, batch):
+        for deal in chunk:
+            conn.execute(LEGACY_UPSERT_SQL, legacy_row(deal))
+        conn.commit()
+
+
+def _timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def bench(rows: int, batch: int, workdir: Path) -> dict:
+    deals = make_deals(rows)
+    changed = [
+        replace(deal, trial_length="7 day") if index % 10 == 0 else deal
+        for index, deal in enumerate(deals)
+    ]
+
+    legacy_conn = sqlite3.connect(str(workdir / f"legacy-{rows}.db"))
+    legacy_conn.executescript(SCHEMA)
+    legacy_insert = _timed(legacy_upsert, legacy_conn, deals, batch)
+    legacy_update = _timed(legacy_upsert, legacy_conn, changed, batch)
+
+    conn = init_db(workdir / f"bulk-{rows}.db")
+    bulk_insert = _timed(store_deals, conn, deals, batch)
+    bulk_update = _timed(store_deals, conn, changed, batch)
+
+    return {
+        "rows": rows,
+        "batch": batch,
+        "legacy_insert_rows_per_sec": round(rows / legacy_insert),
+        "legacy_reupsert_rows_per_sec": round(rows / legacy_update),
+        "bulk_insert_rows_per_sec": round(rows / bulk_insert),
+        "bulk_reupsert_rows_per_sec": round(rows / bulk_update),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--batch", type=int, default=25, help="Deals per commit")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [bench(rows, args.batch, Path(tmp)) for rows in args.rows]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Local stand-in for the sites a scan talks to.
+
+A threaded HTTP server on 127.0.0.1 answers every discovery source (DuckDuckGo HTML,
+reddit/HN/GitHub JSON, Product Hunt RSS, directory pages) and the landing pages that
+verification fetches. ``LocalRouteAdapter`` is mounted on the scan's requests session and
+rewrites ``https://host/path`` to ``http://127.0.0.1:<port>/host/path``, so the code under
+test builds the same URLs it would in production.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+from aisubscalp.httpclient import PooledAdapter
+
+CATEGORIES = ["coding", "writing", "image", "video", "audio", "productivity", "business"]
+OFFERS = [
+    "free trial for 14 days",
+    "100% off with promo code FREEAI2026",
+    "free tier with free credits",
+    "open source and self-hosted",
+    "limited time free",
+    "free plan, no card needed",
+]
+REJECTS = [
+    "50% off this week",
+    "student discount only",
+    "refer a friend to unlock",
+    "paid plans from $20",
+]
+
+
+class FakeWeb:
+    def __init__(
+        self,
+        apps: int = 2000,
+        per_page: int = 25,
+        latency_ms: float = 20.0,
+        jitter_ms: float = 10.0,
+        error_rate: float = 0.0,
+        seed: int = 7,
+    ):
+        self.apps = apps
+        self.per_page = per_page
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.seed = seed
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def __enter__(self) -> "FakeWeb":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _app(self, index: int) -> Tuple[str, str, str]:
+        rng = random.Random(self.seed * 1_000_003 + index)
+        category = CATEGORIES[index % len(CATEGORIES)]
+        pitch = rng.choice(REJECTS) if rng.random() < 0.25 else rng.choice(OFFERS)
+        title = f"App{index} AI {category} assistant - {pitch}"
+        return f"https://app{index}.example/", title, pitch
+
+    def _page(self, key: str) -> List[int]:
+        digest = int(hashlib.sha256(f"{self.seed}:{key}".encode()).hexdigest()[:12], 16)
+        start = digest % self.apps
+        return [(start + offset * 7) % self.apps for offset in range(self.per_page)]
+
+    def _sleep_and_fail(self) -> Optional[int]:
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0.0, self.jitter)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            status = self._random.choice([429, 500, 503]) if failed else None
+        if delay > 0:
+            time.sleep(delay)
+        return status
+
+    def respond(self, host: str, path: str, query: str) -> Tuple[int, str, str]:
+        status = self._sleep_and_fail()
+        if status:
+            return status, "text/plain", "unavailable"
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        key = f"{host}{path}?{params.get('q') or params.get('query') or ''}"
+        if host == "duckduckgo.com":
+            return 200, "text/html", self._duckduckgo(key)
+        if host == "www.reddit.com":
+            return 200, "application/json", self._reddit(key, path)
+        if host == "hn.algolia.com":
+            return 200, "application/json", self._hackernews(key)
+        if host == "api.github.com":
+            return 200, "application/json", self._github(key)
+        if path.endswith(".rss"):
+            return 200, "application/rss+xml", self._rss(key)
+        if host.endswith(".example"):
+            return 200, "text/html", self._landing(host)
+        return 200, "text/html", self._directory(key)
+
+    def _duckduckgo(self, key: str) -> str:
+        links = []
+        for index in self._page(key):
+            url, title, _ = self._app(index)
+            links.append(f'<a class="result__a" href="{url}">{escape(title)}</a>')
+        return "<html><body>" + "\n".join(links) + "</body></html>"
+
+    def _directory(self, key: str) -> str:
+        links = []
+        for index in self._page(key):
+            url, title, _ = self._app(index)
+            links.append(f'<li><a href="{url}">{escape(title)}</a></li>')
+        return "<html><body><ul>" + "\n".join(links) + "</ul></body></html>"
+
+    def _rss(self, key: str) -> str:
+        entries = []
+        for index in self._page(key):
+            url, title, _ = self._app(index)
+            entries.append(f"<item><title>{escape(title)}</title><link>{url}</link></item>")
+        return '<?xml version="1.0"?><rss><channel>' + "".join(entries) + "</channel></rss>"
+
+    def _reddit(self, key: str, path: str) -> str:
+        subreddits = path.split("/")[2].split("+")
+        children = []
+        for position, index in enumerate(self._page(key)):
+            url, title, pitch = self._app(index)
+            data = {
+                "name": f"t3_{index}",
+                "created_utc": 1_700_000_000 - position,
+                "subreddit": subreddits[position % len(subreddits)],
+                "title": title,
+                "url": url,
+                "selftext": f"Found this {pitch} AI tool today.",
+            }
+            children.append({"data": data})
+        return json.dumps({"data": {"children": children, "after": None}})
+
+    def _hackernews(self, key: str) -> str:
+        hits = []
+        for position, index in enumerate(self._page(key)):
+            url, title, pitch = self._app(index)
+            hits.append(
+                {
+                    "title": f"Show HN: {title}",
+                    "url": url,
+                    "story_text": pitch,
+                    "created_at_i": 1_700_000_000 - position,
+                }
+            )
+        return json.dumps({"hits": hits, "nbPages": 1})
+
+    def _github(self, key: str) -> str:
+        items = []
+        for index in self._page(key):
+            url, title, _ = self._app(index)
+            items.append(
+                {
+                    "full_name": f"example/app{index}",
+                    "html_url": url,
+                    "description": f"Open source self-hosted AI app. {title}",
+                }
+            )
+        return json.dumps({"items": items})
+
+    def _landing(self, host: str) -> str:
+        index = int(host.split(".")[0].removeprefix("app") or 0)
+        _, title, pitch = self._app(index)
+        body = escape(f"{title}. Start your {pitch} today.") if index % 10 else "Pricing"
+        return f"<html><head><title>{escape(title)}</title></head><body>{body}</body></html>"
+
+    def _handler(self) -> type:
+        web = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                parts = urlsplit(self.path)
+                host, _, path = parts.path.lstrip("/").partition("/")
+                status, content_type, body = web.respond(host, "/" + path, parts.query)
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                if status in (429, 503):
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+class LocalRouteAdapter(PooledAdapter):
+    def __init__(self, port: int, *args: Any, **kwargs: Any):
+        self.port = port
+        super().__init__(*args, **kwargs)
+
+    def send(self, request: Any, *args: Any, **kwargs: Any) -> Any:
+        parts = urlsplit(request.url)
+        if parts.hostname != "127.0.0.1":
+            path = f"/{parts.hostname}{parts.path or '/'}"
+            request.url = urlunsplit(("http", f"127.0.0.1:{self.port}", path, parts.query, ""))
+        return super().send(request, *args, **kwargs)
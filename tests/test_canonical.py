@@ -0,0 +1,33 @@
+from aisubscalp.canonical import canonicalize_url, merge_candidates
+from aisubscalp.models import SourceItem
+
+
+def test_canonicalize_strips_tracking_and_normalizes():
+    url = "HTTPS://Tool.Example:443/pricing/?utm_source=x&b=2&ref=hn&a=1&fbclid=abc#plans"
+    assert canonicalize_url(url) == "https://tool.example/pricing?a=1&b=2"
+
+
+def test_canonicalize_follows_known_redirectors():
+    url = "//duckduckgo.com/l/?uddg=https%3A%2F%2Ftool.example%2F%3Futm_medium%3Dddg&rut=abc"
+    assert canonicalize_url(url) == "https://tool.example/"
+
+
+def test_merge_candidates_groups_by_canonical_url():
+    items = [
+        SourceItem(
+            title="Tool AI", url="https://tool.example/?utm_source=ddg", source="duckduckgo"
+        ),
+        SourceItem(
+            title="Show HN: Tool",
+            url="https://tool.example",
+            source="hackernews",
+            snippet="free plan",
+        ),
+        SourceItem(title="Other", url="https://other.example/", source="duckduckgo"),
+    ]
+    merged = merge_candidates(items)
+    assert [item.url for item in merged] == ["https://tool.example/", "https://other.example/"]
+    assert merged[0].title == "Tool AI"
+    assert merged[0].snippet == "Show HN: Tool free plan"
+    assert merged[0].source == "duckduckgo, hackernews"
+    assert merged[0].source_urls == ["https://tool.example/?utm_source=ddg", "https://tool.example"]
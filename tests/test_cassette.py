@@ -0,0 +1,57 @@
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from aisubscalp.cassette import CassetteStore, attach_cassette
+from aisubscalp.httpclient import HttpClient
+from aisubscalp.ratelimit import HostRateLimiter
+
+
+def _fake_send(self, request, *args, **kwargs):
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = "OK"
+    response.headers["Content-Type"] = "text/html; charset=utf-8"
+    response.url = request.url
+    response.request = request
+    response._content = f"page {request.url}".encode()
+    return response
+
+
+def test_recorded_run_replays_without_network(tmp_path, monkeypatch):
+    store = CassetteStore(tmp_path / "cassettes.db")
+    store.start_run("run-a")
+    monkeypatch.setattr(HTTPAdapter, "send", _fake_send)
+    with HttpClient(HostRateLimiter(rate=1000.0)) as client:
+        attach_cassette(client, store, "run-a")
+        assert client.get("https://example.com/a").text == "page https://example.com/a"
+        client.get("https://example.com/b")
+
+    def offline(self, request, *args, **kwargs):
+        raise AssertionError("replay went to the network")
+
+    monkeypatch.setattr(HTTPAdapter, "send", offline)
+    with HttpClient(HostRateLimiter(rate=1000.0)) as client:
+        adapter = attach_cassette(client, store, store.resolve("latest"), replay=True)
+        response = client.get("https://example.com/a")
+        assert response.status_code == 200
+        assert response.text == "page https://example.com/a"
+        with pytest.raises(requests.ConnectionError):
+            client.get("https://example.com/missing")
+    assert adapter.misses == 1
+    store.close()
+
+
+def test_retention_drops_oldest_run_and_keeps_shared_bodies(tmp_path):
+    store = CassetteStore(tmp_path / "cassettes.db", max_bytes=0)
+    for run_id in ["run-a", "run-b"]:
+        store.start_run(run_id)
+        store.record(run_id, "GET", "https://example.com/", 200, "OK", {}, b"same page")
+    store.record("run-a", "GET", "https://example.com/old", 200, "OK", {}, b"only in a")
+    store.max_bytes = store.total_bytes() - 1
+
+    assert store.enforce_retention(keep="run-b") == 1
+    assert [run for run, _, _ in store.runs()] == ["run-b"]
+    [exchange] = store.exchanges("run-b")
+    assert store.body(exchange.digest) == b"same page"
+    store.close()
@@ -0,0 +1,43 @@
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from aisubscalp.daemon import ScanRuntime
+
+CONFIG_DIR = Path(__file__).resolve().parents[1] / "config"
+
+
+def _bump(path, **changes):
+    data = json.loads(path.read_text())
+    data.update(changes)
+    path.write_text(json.dumps(data))
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+
+def test_runtime_keeps_warm_state_until_config_changes(tmp_path):
+    config_dir = tmp_path / "config"
+    shutil.copytree(CONFIG_DIR, config_dir)
+    with ScanRuntime(config_dir, tmp_path / "deals.db", tmp_path / "cache.db") as runtime:
+        client = runtime.client
+        conn = runtime.conn
+        assert runtime.reload() is False
+        assert runtime.conn is conn
+
+        _bump(config_dir / "sources.json", max_results_per_source=5)
+        assert runtime.reload() is True
+        assert runtime.config.max_results_per_source == 5
+        assert runtime.client is client
+
+        _bump(config_dir / "sources.json", http={"read_timeout": 3.0})
+        assert runtime.reload() is True
+        assert runtime.client is not client
+        assert runtime.client.timeout == (5.0, 3.0)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(runtime.conn))
+        thread.start()
+        thread.join()
+        assert other[0] is not conn
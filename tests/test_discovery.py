@@ -0,0 +1,152 @@
+import time
+
+from aisubscalp import discovery
+from aisubscalp.httpclient import HttpClient
+from aisubscalp.models import SourceItem
+from aisubscalp.ratelimit import HostRateLimiter
+from aisubscalp.storage import get_cursor, init_db
+
+SOURCES = {
+    "reddit": {"subreddits": ["a", "b"], "queries": ["x"]},
+    "hackernews": {"queries": ["q1", "q2"]},
+}
+
+
+def _fake_search(name, delay):
+    def search(*args, **kwargs):
+        label = "/".join(str(arg) for arg in args[:-2])
+        time.sleep(delay)
+        return [
+            SourceItem(title=f"{name}:{label}", url=f"https://{name}.test/{label}", source=name)
+        ]
+
+    return search
+
+
+def test_concurrent_discovery_matches_sequential_order(monkeypatch):
+    monkeypatch.setattr(discovery, "search_duckduckgo", _fake_search("ddg", 0.05))
+    monkeypatch.setattr(discovery, "search_reddit", _fake_search("reddit", 0.05))
+    monkeypatch.setattr(discovery, "search_hackernews", _fake_search("hn", 0.05))
+    client = HttpClient(HostRateLimiter(rate=1000.0))
+
+    tasks = discovery.plan_discovery(["d1", "d2"], SOURCES, None)
+
+    def titles(workers):
+        found = sorted(discovery.iter_task_results(tasks, client, 5, workers))
+        return [item.title for _, items in found for item in items]
+
+    sequential = titles(1)
+    start = time.monotonic()
+    concurrent = titles(4)
+    elapsed = time.monotonic() - start
+
+    assert concurrent == sequential
+    assert elapsed < 0.25
+
+
+def test_discovery_workers_wait_for_a_slow_consumer():
+    ran = []
+
+    def task(client, limit):
+        ran.append(1)
+        return [SourceItem(title="t", url="https://t.test", source="s")]
+
+    tasks = [(f"host{index % 2}.test", task) for index in range(20)]
+    results = discovery.iter_task_results(tasks, None, 5, workers=2)
+    next(results)
+    time.sleep(0.2)
+
+    # Two results queued, one finished page held by each worker, one consumed.
+    assert len(ran) <= 5
+    results.close()
+
+
+class _JsonResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class _ListingClient:
+    def __init__(self, pages):
+        self.pages = pages
+        self.urls = []
+
+    def get(self, url, headers=None):
+        self.urls.append(url)
+        after = url.split("&after=")[1] if "&after=" in url else None
+        return _JsonResponse(self.pages[after])
+
+
+def _post(index):
+    return {
+        "data": {
+            "name": f"t3_{index}",
+            "created_utc": 1000 + index,
+            "title": f"Post {index}",
+            "url": f"https://post{index}.test",
+        }
+    }
+
+
+def test_reddit_cursor_fetches_only_new_posts(tmp_path):
+    cursors = discovery.SourceCursors(init_db(tmp_path / "deals.db"))
+    client = _ListingClient({None: {"data": {"children": [_post(2), _post(1)], "after": None}}})
+    assert len(discovery.search_reddit("ai", "free", client, 2, cursors)) == 2
+    assert cursors.commit() == 1
+
+    client = _ListingClient(
+        {
+            None: {"data": {"children": [_post(5), _post(4)], "after": "t3_4"}},
+            "t3_4": {"data": {"children": [_post(3), _post(2)], "after": "t3_2"}},
+            "t3_2": {"data": {"children": [_post(1)], "after": None}},
+        }
+    )
+    found = discovery.search_reddit("ai", "free", client, 2, cursors)
+
+    assert [item.title for item in found] == ["Post 5", "Post 4", "Post 3"]
+    assert len(client.urls) == 2
+    cursors.commit()
+    assert get_cursor(cursors.conn, "reddit/ai", "free") == {
+        "created_utc": 1005.0,
+        "fullname": "t3_5",
+    }
+
+
+def test_hackernews_cursor_uses_numeric_filter(tmp_path):
+    cursors = discovery.SourceCursors(init_db(tmp_path / "deals.db"))
+    cursors.advance("hackernews", "ai", {"created_at_i": 1700})
+    client = _ListingClient(
+        {
+            None: {
+                "hits": [{"title": "New", "url": "https://new.test", "created_at_i": 1800}],
+                "nbPages": 1,
+            }
+        }
+    )
+
+    found = discovery.search_hackernews("ai", client, 10, cursors)
+
+    assert [item.title for item in found] == ["New"]
+    assert "numericFilters=created_at_i%3E1700" in client.urls[0]
+    assert cursors.get("hackernews", "ai") == {"created_at_i": 1800}
+
+
+def test_parse_producthunt_rss_without_lxml():
+    xml = (
+        '<?xml version="1.0" encoding="UTF-8"?><rss><channel>'
+        "<item><title>Notes AI &amp; more</title><link>https://notes.test/</link></item>"
+        "<item><title>No link</title></item>"
+        "</channel></rss>"
+    )
+
+    items = discovery._parse_producthunt_rss(xml, 5)
+
+    assert [(item.title, item.url) for item in items] == [
+        ("Notes AI & more", "https://notes.test/")
+    ]
+    assert discovery._parse_producthunt_rss("<rss><channel>", 5) == []
@@ -0,0 +1,45 @@
+import csv
+import gzip
+import json
+
+from aisubscalp.exporter import EXPORT_FIELDS, export_csv, export_json, export_ndjson
+from aisubscalp.utils import to_json
+
+
+def _records(count):
+    for index in range(count):
+        yield {
+            "app_name": f"App {index}",
+            "website_url": f"https://app{index}.example",
+            "promo_type": "Free",
+            "trial_length": None,
+            "requirements": None,
+            "promo_code": None,
+            "source_urls": [f"https://app{index}.example/", 'https://news.example/"quoted"'],
+            "date_found": "2026-01-01T00:00:00+00:00",
+            "category": "coding",
+            "notes": "multi\nline",
+            "verification_status": "Verified",
+            "verification_notes": None,
+        }
+
+
+def test_streaming_json_matches_indented_dump(tmp_path):
+    for count in (0, 1, 3):
+        path = tmp_path / f"deals-{count}.json"
+        assert export_json(_records(count), path) == count
+        assert path.read_text(encoding="utf-8") == to_json(list(_records(count)))
+
+
+def test_ndjson_gzip_and_csv_use_fixed_schema(tmp_path):
+    ndjson_path = tmp_path / "deals.ndjson.gz"
+    export_ndjson(_records(2), ndjson_path, compress=True)
+    with gzip.open(ndjson_path, "rt", encoding="utf-8") as handle:
+        rows = [json.loads(line) for line in handle]
+    assert [list(row) for row in rows] == [EXPORT_FIELDS, EXPORT_FIELDS]
+
+    csv_path = tmp_path / "empty.csv"
+    assert export_csv(iter(()), csv_path) == 0
+    with csv_path.open(encoding="utf-8", newline="") as handle:
+        assert next(csv.reader(handle)) == EXPORT_FIELDS
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["deals.ndjson.gz", "empty.csv"]
@@ -1,4 +1,4 @@
-from aisubscalp.filters import apply_filters, extract_trial_length
+from aisubscalp.filters import apply_filters, apply_filters_batch, extract_trial_length
 
 
 def test_accepts_free_trial():
@@ -26,3 +26,19 @@ def test_accepts_open_source():
     result = apply_filters(text)
     assert result.allowed
     assert result.promo_type == "Open-Source"
+
+
+def test_batch_matches_scalar_path():
+    texts = [
+        "Amazing AI tool with a free trial for 14 days.",
+        "AI platform save 50% today.",
+        "Open source AI image app you can self-host.",
+        "AI notes app 100% off with code FREEAI2026",
+        "Budget tracker, free forever",
+    ] * 7
+    expected = [apply_filters(text) for text in texts]
+    serial = apply_filters_batch(texts)
+    parallel = apply_filters_batch(texts, workers=2, chunk_size=4, parallel_min=0)
+    for batch in (serial, parallel):
+        assert len(batch) == len(texts)
+        assert [batch.result(index) for index in range(len(batch))] == expected
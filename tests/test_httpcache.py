@@ -0,0 +1,72 @@
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from aisubscalp import discovery
+from aisubscalp.httpcache import HttpCache
+from aisubscalp.httpclient import HttpClient
+from aisubscalp.ratelimit import HostRateLimiter
+
+PAGE = b'<html><a class="result__a" href="https://tool.example/">AI tool free trial</a></html>'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_not_modified_skips_parsing(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/html"
+    parsed = []
+
+    def parse(html):
+        parsed.append(html)
+        return discovery._parse_duckduckgo(html, 10)
+
+    cache = HttpCache(tmp_path / "cache.db", ttl_seconds={"duckduckgo": 0})
+    try:
+        with HttpClient(HostRateLimiter(rate=1000.0), cache=cache) as client:
+            first = discovery._fetch_items(url, client, "duckduckgo", parse)
+            second = discovery._fetch_items(url, client, "duckduckgo", parse)
+    finally:
+        server.shutdown()
+
+    assert (
+        [item.url for item in second] == [item.url for item in first] == ["https://tool.example/"]
+    )
+    assert len(parsed) == 1
+    assert _Handler.hits == [None, '"v1"']
+    assert cache.revalidated == 1
+
+
+def test_lru_eviction_respects_size_cap(tmp_path):
+    cache = HttpCache(tmp_path / "cache.db", max_bytes=700)
+    for index in range(5):
+        response = requests.Response()
+        response._content = secrets.token_hex(200).encode("utf-8")
+        response.encoding = "utf-8"
+        cache.store(f"https://site.example/{index}", response, [])
+        cache.lookup("https://site.example/0")
+    assert cache.lookup("https://site.example/0") is not None
+    assert cache.lookup("https://site.example/1") is None
+    assert cache.lookup("https://site.example/4") is not None
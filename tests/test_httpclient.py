@@ -0,0 +1,35 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from aisubscalp.httpclient import HttpClient
+from aisubscalp.ratelimit import HostRateLimiter
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_client_reuses_keep_alive_connections():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    try:
+        with HttpClient(HostRateLimiter(rate=1000.0)) as client:
+            for _ in range(3):
+                assert client.get(url).text == "ok"
+            stats = client.stats()
+    finally:
+        server.shutdown()
+    assert stats["requests"] == 3
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 2
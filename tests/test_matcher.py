@@ -0,0 +1,37 @@
+import random
+
+from aisubscalp.filters import apply_filters
+from aisubscalp.matcher import PhraseMatcher
+from aisubscalp.scan import build_matcher, infer_category, infer_requirements
+
+
+def test_scan_finds_overlapping_and_nested_phrases():
+    groups = {
+        "free": ["free for", "free forever", "free"],
+        "ai": ["ai", "aide"],
+        "coding": ["ide", "code"],
+        "referral": ["refer", "referral"],
+    }
+    matcher = PhraseMatcher(groups)
+    phrases = sorted({phrase for terms in groups.values() for phrase in terms})
+    rng = random.Random(3)
+    for _ in range(2000):
+        text = "".join(rng.choice(phrases + [" ", "x"]) for _ in range(rng.randint(0, 6)))
+        text = text[rng.randint(0, len(text)) :]
+        hits = matcher.scan(text)
+        expected = {phrase for phrase in phrases if phrase in text}
+        assert hits.phrases == expected
+        assert hits.groups == {name for name, terms in groups.items() if expected & set(terms)}
+
+
+def test_classifiers_reuse_filter_hits():
+    keywords = {"categories": {"writing": ["blog"], "coding": ["code", "ide"]}}
+    matcher = build_matcher(keywords)
+    text = "Guide: AI code reviewer with a free plan, no credit card. Sign up today"
+    result = apply_filters(text, matcher)
+    assert result.allowed
+    assert result.hits.matcher is matcher
+    assert infer_category(text, keywords, result.hits) == "coding"
+    assert infer_requirements(text, result.hits) == "No credit card required"
+    # Hits from a matcher without these categories are not trusted.
+    assert infer_category(text, keywords, apply_filters(text).hits) == "coding"
@@ -0,0 +1,99 @@
+from aisubscalp import discovery
+from aisubscalp.planner import plan_hackernews, plan_reddit
+
+SOURCES = {
+    "reddit": {"subreddits": ["a", "b", "c"], "queries": ["free trial", "promo code", "open"]},
+    "hackernews": {"queries": ["AI free trial", "AI promo code", "open source AI"]},
+}
+
+
+def test_plan_reddit_coalesces_subreddits_and_queries():
+    plan = plan_reddit(
+        ["a", "b", "c"],
+        ["free trial", "promo code", "open"],
+        {"reddit_subreddits_per_request": 2, "reddit_queries_per_request": 3},
+    )
+
+    assert plan == [
+        ("a+b", '"free trial" OR "promo code" OR open', 6),
+        ("c", '"free trial" OR "promo code" OR open', 3),
+    ]
+
+
+def test_plan_hackernews_merges_only_queries_with_the_same_words():
+    plan = plan_hackernews(
+        ["AI free trial", "AI promo code", "free trial AI", "ai FREE trial"],
+        {"hackernews_queries_per_request": 2},
+    )
+
+    assert plan == [["AI free trial", "free trial AI"], ["ai FREE trial"], ["AI promo code"]]
+
+
+def test_batched_plan_uses_fewer_requests():
+    unbatched = discovery.plan_discovery([], SOURCES, None)
+    batched = discovery.plan_discovery([], SOURCES, None, batching={})
+
+    assert len(unbatched) == 12
+    assert len(batched) == 4
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class _Client:
+    def __init__(self, payload):
+        self.payload = payload
+        self.urls = []
+
+    def get(self, url, headers=None):
+        self.urls.append(url)
+        return _Response(self.payload)
+
+
+def test_batched_reddit_search_tags_each_post_with_its_subreddit():
+    children = [
+        {"data": {"subreddit": sub, "title": f"T {sub}", "url": f"https://{sub}.test"}}
+        for sub in ("a", "b")
+    ]
+    client = _Client({"data": {"children": children, "after": None}})
+
+    found = discovery.search_reddit("a+b", '"free trial" OR open', client, 10, fan_in=4)
+
+    assert [item.source for item in found] == ["reddit/a", "reddit/b"]
+    assert "/r/a+b/search.json" in client.urls[0]
+    assert "limit=40" in client.urls[0]
+
+
+def test_batched_reddit_search_pages_to_the_combined_coverage():
+    children = [
+        {"data": {"subreddit": "a", "title": f"T {index}", "url": f"https://{index}.test"}}
+        for index in range(100)
+    ]
+    client = _Client({"data": {"children": children, "after": "t3_next"}})
+
+    found = discovery.search_reddit("a+b", "x OR y", client, 40, fan_in=6)
+
+    assert len(client.urls) == 3
+    assert all("limit=100" in url for url in client.urls)
+    assert "after=t3_next" in client.urls[1]
+    assert len(found) == 300
+
+
+def test_merged_hackernews_search_sends_one_narrow_query():
+    hits = [{"title": "AI free trial for notes", "url": "https://one.test", "created_at_i": 2}]
+    client = _Client({"hits": hits, "nbPages": 1})
+
+    found = discovery.search_hackernews_merged(["AI free trial", "free trial AI"], client, 5)
+
+    assert [item.url for item in found] == ["https://one.test"]
+    assert len(client.urls) == 1
+    assert "query=AI+free+trial&" in client.urls[0]
+    assert "optionalWords" not in client.urls[0]
+    assert "hitsPerPage=5" in client.urls[0]
@@ -0,0 +1,34 @@
+import time
+
+import requests
+
+from aisubscalp.ratelimit import HostRateLimiter
+
+
+def _response(status, headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+def test_hosts_have_independent_buckets():
+    limiter = HostRateLimiter(rate=1.0, burst=1, hosts={"reddit.com": {"rate": 1.0, "burst": 2}})
+    assert limiter.reserve("https://www.reddit.com/r/a") == 0
+    assert limiter.reserve("https://old.reddit.com/r/b") == 0
+    assert limiter.reserve("https://api.github.com/search") == 0
+    assert limiter.reserve("https://www.reddit.com/r/c") > 0.5
+
+
+def test_retry_after_pauses_only_that_host():
+    limiter = HostRateLimiter(rate=100.0, burst=5)
+    limiter.observe("https://api.github.com/x", _response(429, {"Retry-After": "20"}))
+    assert limiter.reserve("https://api.github.com/y") > 19
+    assert limiter.reserve("https://hn.algolia.com/api") == 0
+
+
+def test_github_rate_limit_headers_block_until_reset():
+    limiter = HostRateLimiter(rate=100.0, burst=5)
+    headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) + 30)}
+    limiter.observe("https://api.github.com/x", _response(200, headers))
+    assert limiter.reserve("https://api.github.com/y") > 25
@@ -0,0 +1,87 @@
+from dataclasses import replace
+
+from aisubscalp.archive import CandidateArchive, read_run
+from aisubscalp.config import AppConfig
+from aisubscalp.models import Deal, SourceItem
+from aisubscalp.rescore import rescore
+from aisubscalp.storage import (
+    bulk_upsert_deals,
+    fetch_deals,
+    init_db,
+    iter_deal_changes,
+    save_verification,
+)
+
+
+def _config(categories):
+    return AppConfig(
+        keywords={"verification_keywords": ["free trial"], "categories": categories},
+        queries=[],
+        sources={},
+        rate_limit_seconds=[0.0, 0.0],
+        max_results_per_source=10,
+    )
+
+
+def test_archive_round_trip_tolerates_truncated_runs(tmp_path):
+    archive = CandidateArchive(tmp_path / "candidates")
+    item = SourceItem(title="Code AI free trial", url="https://a.example/", source="hn")
+    with archive.open_run() as writer:
+        writer.write(item)
+        writer.write(replace(item, url="https://b.example/", source_urls=["https://b.example/"]))
+    assert list(archive.iter_items()) == [
+        item,
+        replace(item, url="https://b.example/", source_urls=["https://b.example/"]),
+    ]
+
+    (path,) = archive.runs()
+    data = path.read_bytes()
+    path.write_bytes(data[: len(data) - 12])
+    assert len(list(read_run(path))) <= 2
+
+
+def test_rescore_updates_deals_without_network(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    archive = CandidateArchive(tmp_path / "candidates")
+    with archive.open_run() as writer:
+        writer.write(SourceItem(title="Code AI free trial", url="https://a.example/", source="hn"))
+        writer.write(SourceItem(title="Writer AI free plan", url="https://c.example/", source="hn"))
+        writer.write(
+            SourceItem(title="Budget app free plan", url="https://d.example/", source="hn")
+        )
+    save_verification(conn, "https://c.example/", "Verified", None, None, "2020-01-01T00:00:00")
+    # Stored under older rules that classified the same candidate differently.
+    stale = Deal(
+        app_name="Code AI free trial",
+        website_url="https://a.example",
+        promo_type="Free",
+        trial_length=None,
+        requirements=None,
+        promo_code=None,
+        source_urls=["https://a.example/"],
+        date_found="2026-01-01T00:00:00+00:00",
+        category="Unknown",
+        notes="hn: Code AI free trial",
+        verification_status="Unverified",
+        verification_notes=None,
+    )
+    bulk_upsert_deals(conn, [stale])
+
+    stats = rescore(conn, _config({"coding": ["code"]}), archive, workers=1)
+    assert (stats.candidates, stats.deals, stats.inserted, stats.removed) == (3, 2, 2, 1)
+    rows = {row["website_url"]: row for row in fetch_deals(conn)}
+    assert rows["https://a.example"]["category"] == "coding"
+    assert rows["https://a.example"]["promo_type"] == "Free Trial"
+    assert rows["https://a.example"]["verification_status"] == "Unverified"
+    assert rows["https://c.example"]["verification_status"] == "Verified"
+    changes = {
+        (record["promo_type"], record["change"])
+        for record in iter_deal_changes(conn, "2000-01-01T00:00:00", "9999-12-31T00:00:00")
+        if record["website_url"] == "https://a.example"
+    }
+    assert changes == {("Free", "removed"), ("Free Trial", "added")}
+
+    stats = rescore(conn, _config({"writing": ["writer"], "coding": ["code"]}), archive, workers=1)
+    assert (stats.updated, stats.unchanged, stats.removed) == (1, 1, 0)
+    rows = {row["website_url"]: row for row in fetch_deals(conn)}
+    assert rows["https://c.example"]["category"] == "writing"
@@ -0,0 +1,94 @@
+import io
+
+import requests
+
+from aisubscalp.config import AppConfig
+from aisubscalp.models import SourceItem
+from aisubscalp.scan import stream_deals
+from aisubscalp.storage import fetch_deals, init_db, store_deals
+
+
+class _FakeClient:
+    timeout = (5.0, 20.0)
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(b"free trial")
+        return response
+
+
+def _config():
+    return AppConfig(
+        keywords={"verification_keywords": ["free trial"], "categories": {"coding": ["code"]}},
+        queries=[],
+        sources={},
+        rate_limit_seconds=[0.0, 0.0],
+        max_results_per_source=10,
+        pipeline={"verify_batch_size": 2},
+    )
+
+
+def test_stream_deals_verifies_each_url_once_and_merges_sources(tmp_path):
+    items = [
+        SourceItem(title="Code AI free trial", url="https://a.example/?utm_source=x", source="ddg"),
+        SourceItem(title="Not relevant", url="https://b.example/", source="ddg"),
+        SourceItem(title="Writer AI free plan", url="https://c.example/", source="hn"),
+        SourceItem(title="Code AI free trial", url="https://a.example/", source="reddit/x"),
+    ]
+    client = _FakeClient()
+    conn = init_db(tmp_path / "deals.db")
+
+    stats = store_deals(conn, stream_deals(iter(items), _config(), client), batch_size=1)
+
+    assert client.calls == ["https://a.example/", "https://c.example/"]
+    assert (stats.inserted, stats.updated, stats.unchanged) == (2, 0, 0)
+    rows = {row["website_url"]: row for row in fetch_deals(conn)}
+    assert rows["https://a.example"]["source_urls"] == [
+        "https://a.example/?utm_source=x",
+        "https://a.example/",
+    ]
+    assert rows["https://a.example"]["category"] == "coding"
+    assert rows["https://c.example"]["verification_status"] == "Verified"
+
+
+def test_rescanning_multi_source_deals_changes_nothing(tmp_path):
+    items = [
+        SourceItem(title="Code AI free trial", url="https://a.example/", source="ddg"),
+        SourceItem(title="Writer AI free plan", url="https://c.example/", source="hn"),
+        SourceItem(title="Code AI free trial", url="https://a.example/?ref=r", source="reddit/x"),
+    ]
+    conn = init_db(tmp_path / "deals.db")
+    config = _config()
+    store_deals(conn, stream_deals(iter(items), config, _FakeClient()), batch_size=1)
+    before = conn.execute("select last_changed from deals order by id").fetchall()
+
+    for _ in range(2):
+        yielded = []
+        deals = stream_deals(iter(items), config, _FakeClient())
+        stats = store_deals(conn, (yielded.append(deal) or deal for deal in deals), batch_size=1)
+        assert len(yielded) == 2
+        assert (stats.inserted, stats.updated, stats.unchanged) == (0, 0, 2)
+    assert conn.execute("select last_changed from deals order by id").fetchall() == before
+
+
+def test_later_snippets_can_accept_a_rejected_url(tmp_path):
+    items = [
+        SourceItem(title="Code AI assistant", url="https://e.example/", source="ddg"),
+        SourceItem(
+            title="Show HN: Code AI",
+            url="https://e.example/?utm_source=hn",
+            source="hn",
+            snippet="Free trial for 14 days",
+        ),
+    ]
+
+    (deal,) = stream_deals(iter(items), _config(), _FakeClient())
+
+    assert deal.app_name == "Code AI assistant"
+    assert deal.promo_type == "Free Trial"
+    assert deal.source_urls == ["https://e.example/", "https://e.example/?utm_source=hn"]
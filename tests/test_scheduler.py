@@ -0,0 +1,65 @@
+import threading
+
+from aisubscalp.scheduler import SourceJob, SourceScheduler, jobs_from_config
+
+
+def test_jobs_from_config_merges_defaults_and_overrides():
+    schedule = {
+        "default": {"interval_minutes": 60, "jitter_seconds": 5, "deadline_minutes": 10},
+        "sources": {"reddit": {"interval_minutes": 15}},
+    }
+
+    reddit, github = jobs_from_config(schedule, ["reddit", "github"])
+
+    assert (reddit.interval, reddit.jitter, reddit.deadline) == (900, 5, 600)
+    assert (github.interval, github.jitter, github.deadline) == (3600, 5, 600)
+    assert jobs_from_config(schedule, ["github"], interval_minutes=30)[0].interval == 1800
+
+
+def _wait_idle(job):
+    assert job.lock.acquire(timeout=5)
+    job.lock.release()
+
+
+def test_scheduler_skips_sources_still_in_flight():
+    release = threading.Event()
+    calls = []
+
+    def run_job(job, deadline):
+        calls.append((job.name, deadline))
+        if job.name == "slow":
+            release.wait(5)
+
+    jobs = [SourceJob("slow", interval=10, deadline=30), SourceJob("fast", interval=5)]
+    scheduler = SourceScheduler(jobs, run_job, max_workers=2)
+    scheduler.start(now=0.0)
+
+    assert scheduler.run_pending(now=0.0) == 5.0
+    _wait_idle(jobs[1])
+    assert scheduler.run_pending(now=5.0) == 5.0
+    _wait_idle(jobs[1])
+    scheduler.run_pending(now=10.0)
+    release.set()
+    scheduler.executor.shutdown(wait=True)
+
+    assert scheduler.runs == {"slow": 1, "fast": 3}
+    assert scheduler.skipped == {"slow": 1}
+    assert ("slow", 30.0) in calls
+    assert ("fast", None) in calls
+
+
+def test_replace_jobs_keeps_lock_and_reanchors_interval():
+    job = SourceJob("reddit", interval=600)
+    scheduler = SourceScheduler([job], lambda job, deadline: None)
+    scheduler.start(now=0.0)
+    job.lock.acquire()
+    scheduler.run_pending(now=0.0)
+
+    scheduler.replace_jobs([SourceJob("reddit", interval=60), SourceJob("github", interval=60)])
+    reddit = scheduler.jobs[0]
+
+    assert reddit.lock is job.lock
+    assert reddit.next_run == 60.0
+    assert scheduler.in_flight() == 1
+    job.lock.release()
+    scheduler.shutdown()
@@ -0,0 +1,168 @@
+import sqlite3
+from dataclasses import replace
+
+from aisubscalp.models import Deal
+from aisubscalp.storage import (
+    bulk_upsert_deals,
+    get_watermark,
+    init_db,
+    iter_deal_changes,
+    iter_deals,
+    set_watermark,
+)
+
+
+def _deal(index, **changes):
+    deal = Deal(
+        app_name=f"App {index}",
+        website_url=f"https://app{index}.example",
+        promo_type="Free Trial",
+        trial_length="14 day",
+        requirements=None,
+        promo_code=None,
+        source_urls=[f"https://app{index}.example/"],
+        date_found="2026-01-01T00:00:00+00:00",
+        category="coding",
+        notes="duckduckgo: App",
+        verification_status="Verified",
+        verification_notes=None,
+    )
+    return replace(deal, **changes)
+
+
+def test_bulk_upsert_counts_inserted_updated_unchanged(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    assert conn.execute("pragma journal_mode").fetchone()[0] == "wal"
+
+    first = bulk_upsert_deals(conn, [_deal(index) for index in range(5)], chunk_size=2)
+    second = bulk_upsert_deals(
+        conn,
+        [_deal(0), _deal(1, trial_length="7 day"), _deal(9)],
+    )
+
+    assert (first.inserted, first.updated, first.unchanged) == (5, 0, 0)
+    assert (second.inserted, second.updated, second.unchanged) == (1, 1, 1)
+    assert conn.execute("select count(*) from deals").fetchone()[0] == 6
+
+
+def test_unchanged_deals_only_touch_last_seen(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    first = "2026-01-01T00:00:00+00:00"
+    later = "2026-02-01T00:00:00+00:00"
+    bulk_upsert_deals(conn, [_deal(1), _deal(2)], seen_at=first)
+    stats = bulk_upsert_deals(
+        conn,
+        [_deal(1, date_found=later), _deal(2, date_found=later, promo_code="FREEAI")],
+        seen_at=later,
+    )
+
+    rows = conn.execute(
+        "select app_name, date_found, first_seen, last_seen, last_changed from deals order by id"
+    ).fetchall()
+    assert (stats.updated, stats.unchanged) == (1, 1)
+    assert rows[0] == (
+        "App 1",
+        _deal(1).date_found,
+        _deal(1).date_found,
+        later,
+        _deal(1).date_found,
+    )
+    assert rows[1] == ("App 2", _deal(2).date_found, _deal(2).date_found, later, later)
+
+
+def test_source_order_and_sighting_notes_do_not_change_a_deal(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    urls = ["https://app1.example/", "https://reddit.test/r/ai/1"]
+    bulk_upsert_deals(conn, [_deal(1, source_urls=urls)])
+
+    stats = bulk_upsert_deals(
+        conn, [_deal(1, source_urls=urls[::-1], notes="reddit/ai: App 1 is free")]
+    )
+
+    assert (stats.updated, stats.unchanged) == (0, 1)
+
+
+def test_init_db_migrates_legacy_deals_table(tmp_path):
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(str(path))
+    legacy.execute("""
+        create table deals (
+            id integer primary key autoincrement, app_name text not null,
+            website_url text not null, promo_type text not null, trial_length text,
+            requirements text, promo_code text, source_urls text not null,
+            date_found text not null, category text not null, notes text not null,
+            verification_status text not null, verification_notes text
+        )
+        """)
+    legacy.execute(
+        "insert into deals values (null, 'A', 'https://a', 'Free', null, null, null, '[]',"
+        " '2025-01-01', 'coding', 'n', 'Verified', null)"
+    )
+    legacy.commit()
+    legacy.close()
+
+    conn = init_db(path)
+    assert conn.execute("select first_seen, last_changed from deals").fetchone() == (
+        "2025-01-01",
+        "2025-01-01",
+    )
+
+
+def test_iter_deals_paginates_with_filters(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    deals = [
+        _deal(
+            index,
+            date_found=f"2026-01-{index % 28 + 1:02d}T00:00:00+00:00",
+            category="coding" if index % 2 else "writing",
+        )
+        for index in range(50)
+    ]
+    bulk_upsert_deals(conn, deals)
+
+    coding = list(iter_deals(conn, category="coding", since="2026-01-05", page_size=7))
+
+    expected = sorted(
+        (deal for deal in deals if deal.category == "coding" and deal.date_found >= "2026-01-05"),
+        key=lambda deal: deal.date_found,
+        reverse=True,
+    )
+    assert [row["date_found"] for row in coding] == [deal.date_found for deal in expected]
+    assert len({row["app_name"] for row in coding}) == len(expected)
+    assert len(list(iter_deals(conn, page_size=10))) == 50
+
+
+def test_iter_deal_changes_reports_added_changed_and_expired(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    old = "2026-01-01T00:00:00+00:00"
+    first = "2026-01-20T00:00:00+00:00"
+    later = "2026-02-01T00:00:00+00:00"
+    bulk_upsert_deals(conn, [_deal(5)], seen_at=old)
+    bulk_upsert_deals(conn, [_deal(1), _deal(2), _deal(3)], seen_at=first)
+    set_watermark(conn, "feed", first, first)
+    bulk_upsert_deals(
+        conn,
+        [_deal(1), _deal(2, promo_code="FREEAI"), _deal(4), _deal(5)],
+        seen_at=later,
+        revive_before="2026-01-15T00:00:00+00:00",
+    )
+
+    since = get_watermark(conn, "feed")
+    changes = list(
+        iter_deal_changes(
+            conn,
+            since=since,
+            until=later,
+            expire_before="2026-01-25T00:00:00+00:00",
+            expired_since="2026-01-06T00:00:00+00:00",
+        )
+    )
+
+    assert [(change["app_name"], change["change"]) for change in changes] == [
+        ("App 5", "changed"),
+        ("App 2", "changed"),
+        ("App 4", "added"),
+        ("App 3", "expired"),
+    ]
+    assert changes[-1]["last_changed"] == first
+    assert get_watermark(conn, "other") is None
@@ -0,0 +1,195 @@
+import io
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+import requests
+import urllib3
+
+from aisubscalp.storage import get_verification, init_db
+from aisubscalp.verify import (
+    CHUNK_SIZE,
+    PENDING,
+    OriginProber,
+    VerificationCache,
+    check_url,
+    verify_many,
+    verify_url,
+)
+
+
+class _FakeClient:
+    timeout = (5.0, 20.0)
+
+    def __init__(self, body, content_type=None):
+        self.body = body
+        self.content_type = content_type
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(self.body.encode("utf-8"))
+        response.encoding = "utf-8"
+        if self.content_type:
+            response.headers["Content-Type"] = self.content_type
+        return response
+
+
+def test_verification_cache_hits_within_ttl(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    client = _FakeClient("<p>Start your FREE TRIAL today</p>")
+    verifier = VerificationCache(conn)
+
+    first = verifier.verify("https://Tool.example/pricing/", ["free trial"], client)
+    second = verifier.verify("https://tool.example/pricing#plans", ["free trial"], client)
+
+    assert first == second == ("Verified", None)
+    assert client.calls == ["https://Tool.example/pricing/"]
+    assert (verifier.hits, verifier.misses) == (1, 1)
+
+
+def test_expired_unverified_results_are_rechecked(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    client = _FakeClient("<p>Pricing</p>")
+    verifier = VerificationCache(conn, unverified_ttl=timedelta(0))
+
+    verifier.verify("https://tool.example/", ["free trial"], client)
+    status, notes = verifier.verify("https://tool.example/", ["free trial"], client)
+
+    assert status == "Unverified"
+    assert notes == "Verification keywords missing"
+    assert len(client.calls) == 2
+
+
+def test_check_url_stops_at_first_match_and_caps_the_body():
+    # The keyword straddles the first chunk boundary; nothing after that chunk is read.
+    page = "x" * (CHUNK_SIZE - 4) + "Free Trial" + "y" * CHUNK_SIZE * 4
+    result = check_url("https://tool.example/", ["free trial"], _FakeClient(page))
+    assert (result.status, result.match_offset) == ("Verified", CHUNK_SIZE - 4)
+    assert result.bytes_read == 2 * CHUNK_SIZE
+
+    capped = check_url("https://tool.example/", ["free trial"], _FakeClient(page), max_bytes=100)
+    assert (capped.status, capped.bytes_read) == ("Unverified", 100)
+
+    pdf = check_url(
+        "https://tool.example/a.pdf", ["free trial"], _FakeClient(page, "application/pdf")
+    )
+    assert (pdf.status, pdf.notes, pdf.bytes_read) == (
+        "Unverified",
+        "Not a web page (application/pdf)",
+        0,
+    )
+
+
+class _Trickle(io.RawIOBase):
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        time.sleep(0.02)
+        buffer[:1] = b"x"
+        return 1
+
+
+class _TrickleClient:
+    timeout = (5.0, 20.0)
+
+    def get(self, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = urllib3.HTTPResponse(
+            body=io.BufferedReader(_Trickle()), preload_content=False
+        )
+        return response
+
+
+def test_check_url_gives_up_on_a_page_that_trickles_in():
+    started = time.monotonic()
+    result = check_url("https://tool.example/", ["free trial"], _TrickleClient(), timeout=0.3)
+    assert time.monotonic() - started < 2
+    assert result.status == "Unverified"
+    assert result.notes == "Request failed: Body not read within 0.3s"
+
+
+class _SiteClient:
+    timeout = (5.0, 20.0)
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.calls[url] += 1
+        time.sleep(0.01)
+        response = requests.Response()
+        response.status_code = 200 if url in self.pages else 404
+        response.raw = io.BytesIO(self.pages.get(url, "").encode("utf-8"))
+        return response
+
+
+def test_origin_is_probed_once_and_confirms_the_offer():
+    client = _SiteClient(
+        {
+            "https://tool.example/blog/launch": "<p>We launched</p>",
+            "https://tool.example/pricing": "<p>14-day free trial</p>",
+            "https://github.com/pricing": "<p>free trial</p>",
+        }
+    )
+    prober = OriginProber(client, ["free trial"], paths=["/pricing", "/plans"], workers=2)
+    urls = ["https://tool.example/blog/launch", "https://tool.example/changelog"] * 3
+    results = verify_many(urls, lambda url: verify_url(url, ["free trial"], client, prober=prober))
+
+    assert results == [("Verified", "Confirmed on https://tool.example/pricing")] * 6
+    assert client.calls["https://tool.example/pricing"] == 1
+    assert client.calls["https://tool.example/plans"] <= 1
+    assert verify_url("https://github.com/a/b", ["free trial"], client, prober=prober)[0] == (
+        "Unverified"
+    )
+    assert "https://github.com/pricing" not in client.calls
+
+
+def test_verify_many_keeps_order_caps_hosts_and_marks_pending():
+    lock = threading.Lock()
+    active = Counter()
+    peak = Counter()
+
+    def check(url):
+        host = url.split("/")[2]
+        with lock:
+            active[host] += 1
+            peak[host] = max(peak[host], active[host])
+        time.sleep(1.0 if "slow" in url else 0.02)
+        with lock:
+            active[host] -= 1
+        return "Verified", url
+
+    urls = [f"https://a.example/{index}" for index in range(6)] + ["https://slow.example/"]
+    results = verify_many(urls, check, workers=4, per_host=2, deadline=0.5)
+
+    assert results[:6] == [("Verified", url) for url in urls[:6]]
+    assert results[6] == PENDING
+    assert peak["a.example"] == 2
+
+
+def test_abandoned_checks_do_not_write_late_results(tmp_path):
+    conn = init_db(tmp_path / "deals.db")
+    verifier = VerificationCache(conn)
+    client = _FakeClient("<p>free trial</p>")
+    release, finished = threading.Event(), threading.Event()
+
+    def check(url):
+        release.wait(5)
+        try:
+            return verifier.verify(url, ["free trial"], client)
+        finally:
+            finished.set()
+
+    assert verify_many(["https://tool.example/"], check, deadline=0.1) == [PENDING]
+    release.set()
+    assert finished.wait(5)
+    assert get_verification(conn, "https://tool.example/") is None